@@ -11,9 +11,18 @@ import requests
 import socket
 import logging
 import platform
-from schedule import every, repeat, run_pending
-from urllib.parse import urlparse
-from collections import Counter
+import threading
+import signal
+import queue
+import hashlib
+import re
+import fnmatch
+from urllib.parse import urlparse, parse_qs, quote
+from collections import Counter, deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FetchTimeoutError, as_completed
+from typing import NamedTuple, Callable
 
 
 """Configure logging"""
@@ -22,6 +31,97 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
+module_loaded = time.perf_counter()
+
+CHECK_TYPES = ("images", "networks", "volumes", "stacks", "containers")
+"""Docker event types and the resource checks they affect"""
+EVENT_CHECKS = {
+    "container": {"containers", "stacks", "networks", "volumes"},
+    "image": {"images"},
+    "network": {"networks"},
+    "volume": {"volumes"}
+}
+"""Docker event types and the listing they change; containers, networks and volumes are relisted by ID in events mode"""
+EVENT_SOURCES = {"container": "containers", "image": "images", "network": "networks", "volume": "volumes"}
+"""Key of the items of each listing and the API filter selecting items by that key"""
+LISTING_KEYS = {"containers": ("Id", "id"), "networks": ("Id", "id"), "volumes": ("Name", "name")}
+IGNORED_EVENT_ACTIONS = ("exec_", "attach", "resize", "top", "export", "archive-path", "copy", "commit", "save")
+EVENTS_DEBOUNCE = 0.3
+pending_checks_lock = threading.Lock()
+pending_checks_event = threading.Event()
+MONITOR_WORKERS = 8
+"""Default polling interval of each check as a multiple of SEC_REPEAT"""
+CHECK_INTERVAL_FACTORS = {"containers": 1, "stacks": 1, "networks": 3, "volumes": 3, "images": 6}
+"""Checks that back off while idle; containers and stacks keep their interval so a state change is never reported later"""
+BACKOFF_CHECKS = {"networks", "volumes", "images"}
+MAX_FETCH_WORKERS = 32
+"""Messaging platforms as (sender, queue) pairs, replaced as a whole on reload so a reader never sees a half-swapped list"""
+platform_channels = ()
+PLATFORM_KEYS = ("platform_webhook_url", "platform_header", "platform_payload", "platform_format_message")
+SEND_MAX_BACKOFF = 60
+COLLAPSE_CHECKS = {"containers", "stacks"}
+digest = {}
+digest_lock = threading.Lock()
+digest_timer = None
+digest_stats = {"messages": 0, "bytes": 0}
+digest_totals = Counter()
+"""Order of the sections of a digest message, the resource checks followed by the container stats alerts"""
+DIGEST_SECTIONS = (*CHECK_TYPES, "stats")
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS = {
+    "dockcheck_resources": ("gauge", "Monitored Docker resources"),
+    "dockcheck_unused_resources": ("gauge", "Docker networks and volumes not used by any container"),
+    "dockcheck_container_state": ("gauge", "Current state of each container"),
+    "dockcheck_container_health": ("gauge", "Current health check status of each container"),
+    "dockcheck_container_state_seconds_total": ("counter", "Time each container spent in each state since dockcheck started tracking it"),
+    "dockcheck_container_restarts": ("gauge", "Restarts of each container seen by dockcheck"),
+    "dockcheck_container_flapping": ("gauge", "1 while the alerts of a flapping container are paused"),
+    "dockcheck_send_queue_messages": ("gauge", "Messages waiting in the queue of each messaging platform"),
+    "dockcheck_monitor_duration_seconds": ("histogram", "Runtime of a monitoring cycle of a Docker host"),
+    "dockcheck_check_duration_seconds": ("histogram", "Runtime of each resource check section of a monitoring cycle"),
+    "dockcheck_docker_api_duration_seconds": ("histogram", "Docker API request latency"),
+    "dockcheck_send_duration_seconds": ("histogram", "Messaging platform request latency"),
+    "dockcheck_send_failures_total": ("counter", "Messages that could not be delivered after all retries"),
+    "dockcheck_image_updates": ("gauge", "Image tags used by running containers with a newer digest in the registry"),
+    "dockcheck_registry_requests_total": ("counter", "Registry requests made by the image update check"),
+    "dockcheck_container_cpu_percent": ("gauge", "Latest sampled CPU usage of each running container, 100 per CPU core"),
+    "dockcheck_container_memory_percent": ("gauge", "Latest sampled memory usage of each running container against its limit"),
+    "dockcheck_stats_duration_seconds": ("histogram", "Docker API latency of one container stats sample")
+}
+METRICS_LABEL_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n"})
+metrics_lock = threading.Lock()
+"""API call counter of the monitoring cycle running on this thread, set for its fetch tasks too"""
+api_call_context = threading.local()
+metric_histograms = {}
+metric_counters = Counter()
+NO_MESSAGING_KEYS = {
+    "MONITORING_RESOURCES", "STARTUP_MESSAGE", "COMPACT_MESSAGE", "DEFAULT_DOT_STYLE", "SEC_REPEAT", "EVENTS_MODE", "SEC_RECONCILE",
+    "CHECK_INTERVALS", "IDLE_BACKOFF", "LOG_LEVEL", "FETCH_WORKERS", "FETCH_TIMEOUT", "SEND_RETRIES", "SEND_QUEUE_SIZE", "COALESCE_SEC",
+    "UNHEALTHY_ALERT_SEC", "FLAP_CHANGES", "FLAP_WINDOW_SEC", "STATE_FILE", "DOCKER_HOSTS", "FILTERS",
+    "UPDATE_CHECK_SEC", "UPDATE_CACHE_SEC", "UPDATE_WORKERS", "INSECURE_REGISTRIES",
+    "STATS_SEC", "STATS_WORKERS", "STATS_WINDOW", "CPU_ALERT_PERCENT", "MEMORY_ALERT_PERCENT", "HISTORY_FILE", "HISTORY_MAX_EVENTS",
+    "METRICS_ADDRESS", "METRICS_PORT", "TIMING_LOG", "PROFILE_CYCLES", "PROFILE_FILE"
+}
+"""Settings read once at startup, a reload only warns that they changed: setting -> config.json key"""
+RESTART_SETTINGS = {
+    "events_mode": "EVENTS_MODE", "fetch_workers": "FETCH_WORKERS", "send_queue_size": "SEND_QUEUE_SIZE", "flap_changes": "FLAP_CHANGES",
+    "state_file": "STATE_FILE", "metrics_address": "METRICS_ADDRESS", "metrics_port": "METRICS_PORT", "docker_hosts_config": "DOCKER_HOSTS",
+    "update_check_sec": "UPDATE_CHECK_SEC", "update_workers": "UPDATE_WORKERS", "stats_sec": "STATS_SEC", "stats_workers": "STATS_WORKERS",
+    "stats_window": "STATS_WINDOW", "history_file": "HISTORY_FILE"
+}
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), "config.json")
+DOTS = {"orange": "\U0001F7E0", "green": "\U0001F7E2", "red": "\U0001F534", "yellow": "\U0001F7E1"}
+SQUARE_DOTS = {"orange": "\U0001F7E7", "green": "\U0001F7E9", "red": "\U0001F7E5", "yellow": "\U0001F7E8"}
+config_mtime = 0.0
+reload_requested = threading.Event()
+TIMING_PHASES = ("fetch", "diff", "send", "save")
+TIMING_WINDOW = 100
+TIMING_SUMMARY_CYCLES = 20
+profile_lock = threading.Lock()
+profile_stats = None
+profiled_cycles = 0
+"""Profilers of the fetch tasks started while a cycle is profiled, merged into the cycle profile"""
+fetch_profilers = deque()
 
 
 def is_hex(s):
@@ -43,244 +143,1971 @@ def get_platform_base_url() -> str:
     return 'unix://var/run/docker.sock' if platform.system() == "Linux" else 'npipe:////./pipe/docker_engine'
 
 
-def get_docker_info() -> dict:
-    """Get Docker node name and version."""
+def count_docker_api_call(host, response):
+    """Count Docker API round-trips per endpoint for the monitoring cycle that made them, other callers are not counted"""
+    parts = urlparse(response.url).path.strip("/").split("/")
+    endpoint = parts[1] if parts[0].startswith("v1.") and len(parts) > 1 else parts[0]
+    cycle_calls = getattr(api_call_context, "calls", None)
+    if cycle_calls is not None:
+        with metrics_lock:
+            cycle_calls[endpoint] += 1
+    observe_metric("dockcheck_docker_api_duration_seconds", (("node", host.node_name or host.base_url), ("endpoint", endpoint)), response.elapsed.total_seconds())
+
+
+def get_process_uptime() -> float:
+    """Seconds since the process started, including the interpreter and imports where /proc is available"""
     try:
-        docker_client = docker.DockerClient(base_url=platform_base_url)
-        return {
-            "docker_engine_name": docker_client.info().get("Name", ""),
+        with open("/proc/self/stat") as file:
+            start_ticks = int(file.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as file:
+            return max(float(file.read().split()[0]) - start_ticks / os.sysconf("SC_CLK_TCK"), 0)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.perf_counter() - module_loaded
+
+
+def get_peak_memory() -> float:
+    """Peak resident memory of the process in MB, 0 where the resource module is unavailable"""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def get_docker_client(host) -> docker.DockerClient:
+    """Return the shared, pooled Docker client of the host, connecting on first use."""
+    with host.client_lock:
+        if host.client is None:
+            host.client = docker.DockerClient(base_url=host.base_url, tls=host.tls, use_ssh_client=host.use_ssh_client)
+            host.client.api.hooks["response"].append(lambda response, *args, **kwargs: count_docker_api_call(host, response))
+            host.pool_stats = (0, 0)
+        return host.client
+
+
+def close_docker_client(host):
+    """Close the Docker client of the host so the next request reconnects."""
+    with host.client_lock:
+        if host.client:
+            host.client.close()
+            host.client = None
+
+
+def docker_request(host, func):
+    """Run func(client) on the Docker client of the host, reconnecting once if dockerd went away."""
+    try:
+        return func(get_docker_client(host))
+    except requests.exceptions.ConnectionError as e:
+        logger.warning(f"Docker connection to {host.node_name or host.base_url} lost, reconnecting: {e}")
+        close_docker_client(host)
+        return func(get_docker_client(host))
+
+
+def get_docker_pool_stats(host) -> dict:
+    """Requests and new connections of the host's Docker client since the previous call"""
+    total_requests = total_connections = 0
+    with host.client_lock:
+        if host.client:
+            for adapter in host.client.api.adapters.values():
+                pools = getattr(adapter, "pools", None) or getattr(getattr(adapter, "poolmanager", None), "pools", None)
+                for key in list(pools.keys()) if pools else []:
+                    pool = pools.get(key)
+                    if pool:
+                        total_requests += pool.num_requests
+                        total_connections += pool.num_connections
+    requests_count = max(total_requests - host.pool_stats[0], 0)
+    connections = max(total_connections - host.pool_stats[1], 0)
+    host.pool_stats = (total_requests, total_connections)
+    return {"requests": requests_count, "connections": connections, "reused": max(requests_count - connections, 0)}
+
+
+def get_container_health(status: str) -> str:
+    """Extract the health state from a container list status such as 'Up 5 minutes (healthy)'."""
+    if "(health: starting)" in status:
+        return "starting"
+    if "(unhealthy)" in status:
+        return "unhealthy"
+    if "(healthy)" in status:
+        return "healthy"
+    return ""
+
+
+def get_image_name(image: dict) -> str:
+    """Short image name (last two path parts, without tag) from an image list entry"""
+    tags = [tag for tag in image.get("RepoTags") or [] if tag != "<none>:<none>"]
+    image_name = parse_image_reference(tags[0])[1].removeprefix("library/") if tags else image["Id"].split(':')[-1][:10]
+    parts = image_name.rsplit('/', 2)
+    return '/'.join(parts[-2:]) if len(parts) > 1 else parts[0]
+
+
+def get_docker_info(host) -> dict:
+    """Get Docker node name and version, the costly info call is skipped when the host NAME is configured."""
+    try:
+        return docker_request(host, lambda docker_client: {
+            "docker_engine_name": host.node_name or docker_client.info().get("Name", ""),
             "docker_version": docker_client.version().get("Version", "")
-        }
+        })
     except (docker.errors.DockerException, Exception) as e:
         logger.error(f"Error: {e}")
         return {"docker_engine_name": "", "docker_version": ""}
 
 
-def get_docker_resources_counts(stacks_enabled: bool, containers_enabled: bool, images_enabled: bool, networks_enabled: bool, volumes_enabled: bool) -> dict:
-    """Retrieve the count of Docker resources (stacks, containers, images, networks, volumes)"""
-    resources = {"stacks": 0, "containers": 0, "networks": 0, "volumes": 0, "images": 0}
-    try:
-        docker_client = docker.DockerClient(base_url=platform_base_url)
-        containers = docker_client.containers.list()
-        compose_projects = {c.labels.get("com.docker.compose.project") for c in containers if c.labels.get("com.docker.compose.project")}
-        if stacks_enabled:
-            resources["stacks"] = len(compose_projects)
-        if containers_enabled:
-            resources["containers"] = len(containers)
-        if images_enabled:
-            resources["images"] = len(docker_client.images.list())
-        if networks_enabled:
-            resources["networks"] = len(docker_client.networks.list())
-        if volumes_enabled:
-            resources["volumes"] = len(docker_client.volumes.list())
-    except (docker.errors.DockerException, Exception) as e:
-        logger.error(f"Error: {e}")
-    return resources
+class ImageRecord(NamedTuple):
+    short_id: str
+    name: str
+    tags: tuple = ()
+    digests: tuple = ()
 
+    @property
+    def dangling(self) -> bool:
+        return not self.tags
 
-def get_docker_data(data_type: str) -> tuple:
-    """Retrieve detailed data for Docker resources: networks, unused networks, images, containers, stacks, or volumes"""
-    resource_data = []
-    default_networks = {"none", "host", "bridge"}
-    docker_client = None
 
-    try:
-        docker_client = docker.DockerClient(base_url=platform_base_url)
+class NetworkRecord(NamedTuple):
+    name: str
+    short_id: str
 
-        if data_type == "networks":
-            networks = docker_client.networks.list()
-            for network in networks:
-                if network.name not in default_networks:
-                    resource_data.append(f"{network.name} {network.short_id}")
 
-        elif data_type == "unetworks":
-            used_networks = set()
-            networks = docker_client.networks.list()
-            containers = docker_client.containers.list(all=True)
-            for container in containers:
-                container_networks = container.attrs.get("NetworkSettings", {}).get("Networks", {})
-                used_networks.update(container_networks.keys())
-
-            for network in networks:
-                if network.name not in used_networks and network.name not in default_networks:
-                    resource_data.append(f"{network.name} {network.short_id}")
-
-        elif data_type == "images":
-            images = docker_client.images.list(filters={'dangling': False})
-            for image in images:
-                image_name = image.tags[0].split(':')[0] if image.tags else image.short_id.split(':')[-1]
-                parts = image_name.rsplit('/', 2)
-                image_name = '/'.join(parts[-2:]) if len(parts) > 1 else parts[0]
-                resource_data.append(f"{image.short_id.split(':')[-1]} {image_name}")
-
-        elif data_type == "containers":
-            containers = docker_client.containers.list(all=True)
-            inactive_containers = [c for c in containers if c.status != "running"]
-            if len(inactive_containers) != len(containers):
-                for container in containers:
-                    container_info = docker_client.api.inspect_container(container.id)
-                    state = container_info.get("State", {})
-                    health_status = state.get("Health", {}).get("Status")
-                    status = health_status if health_status else state.get("Status", "unknown")
-                    resource_data.append(f"{container.name} {container.status} {status} {container.short_id}")
-
-        elif data_type == "stacks":
-            containers = docker_client.containers.list()
+class VolumeRecord(NamedTuple):
+    name: str
+
+
+class StackRecord(NamedTuple):
+    name: str
+    config_hash: str
+
+
+class ContainerRecord(NamedTuple):
+    name: str
+    status: str
+    health: str
+    short_id: str
+
+
+class DockerSnapshot(NamedTuple):
+    """Immutable view of the Docker resources, each type fetched once per monitoring cycle"""
+    images: tuple = ()
+    networks: tuple = ()
+    unetworks: tuple = ()
+    volumes: tuple = ()
+    uvolumes: tuple = ()
+    stacks: tuple = ()
+    containers: tuple = ()
+
+    def get_counts(self) -> dict:
+        """Count of monitored Docker resources (stacks, containers, networks, volumes, images)"""
+        return {
+            "stacks": len({stack.name for stack in self.stacks}),
+            "containers": sum(1 for container in self.containers if container.status == "running"),
+            "networks": len(self.networks),
+            "volumes": len(self.volumes),
+            "images": sum(1 for image in self.images if not image.dangling)
+        }
+
+
+class ContainerHealth:
+    """State machine of one container: current state, time in each state, restarts and recent state changes"""
+    __slots__ = ("name", "state", "since", "state_time", "restarts", "changes", "flapping", "alerted")
+
+    def __init__(self, name: str, state: str, now: float):
+        self.name, self.state, self.since = name, state, now
+        self.state_time, self.restarts = {}, 0
+        self.changes, self.flapping, self.alerted = deque(maxlen=max(flap_changes, 1)), False, False
+
+    def transition(self, name: str, state: str, now: float):
+        """Move to a new state, accounting the time spent in the previous one"""
+        self.state_time[self.state] = self.state_time.get(self.state, 0) + now - self.since
+        if state in RUNNING_STATES and self.state not in RUNNING_STATES:
+            self.restarts += 1
+        self.name, self.state, self.since, self.alerted = name, state, now, False
+        self.changes.append(now)
+
+
+RUNNING_STATES = {"running", "healthy", "unhealthy", "starting"}
+
+
+class HealthTracker:
+    """Container state machines of one host keyed by container ID, updated only for the containers that changed"""
+    __slots__ = ("containers", "watched", "lock")
+
+    def __init__(self):
+        self.containers, self.watched, self.lock = {}, {}, threading.Lock()
+
+    def seed(self, containers: tuple):
+        now = time.monotonic()
+        with self.lock:
             for container in containers:
-                labels = container.labels or {}
-                stack_name = labels.get("com.docker.compose.project")
-                stack_hash = labels.get("com.docker.compose.config-hash")
-                if stack_name:
-                    resource_data.append(f"{stack_name} {stack_hash}")
-
-        elif data_type in {"volumes", "uvolumes"}:
-            filters = {} if data_type == "volumes" else {"dangling": "true"}
-            volumes = docker_client.volumes.list(filters=filters)
-            for volume in volumes:
-                resource_data.append(f"{volume.short_id}")
+                self.containers[container.short_id] = ContainerHealth(container.name, container.health, now)
+                if container.health == "unhealthy" and unhealthy_alert_sec:
+                    self.watched[container.short_id] = self.containers[container.short_id]
+
+    def update(self, old: tuple, new: tuple) -> tuple:
+        """Apply the changed containers; return the IDs whose change message is held back and the tracker's own messages"""
+        now, held, messages = time.monotonic(), set(), []
+        changed = set(new) - set(old)
+        changed_ids = {container.short_id for container in changed}
+        with self.lock:
+            for container in set(old) - set(new):
+                if container.short_id not in changed_ids:
+                    self.containers.pop(container.short_id, None)
+                    self.watched.pop(container.short_id, None)
+            for container in changed:
+                entry = self.containers.get(container.short_id)
+                if entry and entry.state == container.health:
+                    entry.name = container.name
+                    continue
+                if entry is None:
+                    self.containers[container.short_id] = entry = ContainerHealth(container.name, container.health, now)
+                    entry.changes.append(now)
+                else:
+                    was_unhealthy, was_alerted = entry.state == "unhealthy", entry.alerted
+                    entry.transition(container.name, container.health, now)
+                    if was_unhealthy and not was_alerted and container.health in {"healthy", "running", "starting"}:
+                        """Recovered before UNHEALTHY_ALERT_SEC, neither the failure nor the recovery is reported"""
+                        held.add(container.short_id)
+                if flap_changes and len(entry.changes) == flap_changes and now - entry.changes[0] <= flap_window_sec:
+                    if not entry.flapping:
+                        entry.flapping = True
+                        messages.append(
+                            f"{orange_dot} *{entry.name}*{'' if compact_format else f' ({container.short_id})'}: "
+                            f"flapping, {flap_changes} state changes in {int(now - entry.changes[0])} seconds, alerts paused!"
+                        )
+                    held.add(container.short_id)
+                elif entry.flapping:
+                    held.add(container.short_id)
+                if container.health == "unhealthy" and unhealthy_alert_sec:
+                    held.add(container.short_id)
+                if entry.flapping or (entry.state == "unhealthy" and unhealthy_alert_sec):
+                    self.watched[container.short_id] = entry
+                else:
+                    self.watched.pop(container.short_id, None)
+        return held, messages
+
+    def due_alerts(self) -> list:
+        """Messages of containers unhealthy for longer than UNHEALTHY_ALERT_SEC or no longer flapping, O(watched containers)"""
+        now, messages = time.monotonic(), []
+        with self.lock:
+            for short_id, entry in list(self.watched.items()):
+                container_id = '' if compact_format else f' ({short_id})'
+                if entry.flapping and now - entry.changes[-1] > flap_window_sec:
+                    entry.flapping = False
+                    status_dot = green_dot if entry.state in {"running", "healthy"} else yellow_dot if entry.state == "created" else orange_dot
+                    messages.append(f"{status_dot} *{entry.name}*{container_id}: {entry.state}, flapping stopped!")
+                    entry.alerted = True
+                if not entry.flapping and entry.state == "unhealthy" and not entry.alerted and now - entry.since >= unhealthy_alert_sec:
+                    entry.alerted = True
+                    messages.append(f"{orange_dot} *{entry.name}*{container_id}: unhealthy for {int(now - entry.since)} seconds!")
+                if not entry.flapping and (entry.state != "unhealthy" or entry.alerted):
+                    del self.watched[short_id]
+        return messages
+
+
+class DockerHost:
+    """Connection and monitoring state of one monitored Docker endpoint"""
+    __slots__ = (
+        "base_url", "tls", "use_ssh_client", "node_name", "docker_version", "client", "client_lock", "pool_stats",
+        "api_calls", "monitor_lock", "snapshot", "pending_fetches", "pending_checks", "state_file", "timings", "cycles",
+        "check_intervals", "check_due", "health", "image_updates", "stats", "stats_cost", "stats_offset",
+        "listings", "changed_ids", "full_sources", "monitor_queued"
+    )
+
+    def __init__(self, base_url: str, node_name: str = "", tls=None, use_ssh_client: bool = False):
+        self.base_url, self.tls, self.use_ssh_client = base_url, tls, use_ssh_client
+        self.node_name, self.docker_version = node_name, ""
+        self.client, self.client_lock, self.pool_stats = None, threading.Lock(), (0, 0)
+        self.api_calls, self.monitor_lock = Counter(), threading.Lock()
+        self.snapshot, self.pending_fetches, self.pending_checks = DockerSnapshot(), {}, set()
+        self.state_file, self.timings, self.cycles = "", deque(maxlen=TIMING_WINDOW), 0
+        self.check_intervals, self.check_due, self.health = {}, {}, HealthTracker()
+        self.image_updates, self.stats, self.stats_cost, self.stats_offset = {}, {}, 0.0, 0
+        self.listings, self.changed_ids, self.full_sources = {}, {}, set()
+        self.monitor_queued = False
+
+
+def get_docker_hosts(hosts_config: list) -> list:
+    """Create the monitored Docker hosts from DOCKER_HOSTS, the local Docker socket by default"""
+    docker_hosts = []
+    for host_config in hosts_config or [{}]:
+        tls, tls_config = None, host_config.get("TLS")
+        if tls_config:
+            client_cert = (tls_config["CLIENT_CERT"], tls_config["CLIENT_KEY"]) if tls_config.get("CLIENT_CERT") else None
+            tls = docker.tls.TLSConfig(client_cert=client_cert, ca_cert=tls_config.get("CA_CERT"), verify=tls_config.get("VERIFY", True))
+        docker_hosts.append(DockerHost(
+            host_config.get("BASE_URL") or get_platform_base_url(), host_config.get("NAME", ""), tls, host_config.get("USE_SSH_CLIENT", False)
+        ))
+    return docker_hosts
+
+
+"""Raw Docker API listings required by each resource check"""
+CHECK_SOURCES = {
+    "images": {"images"},
+    "networks": {"networks", "containers"},
+    "volumes": {"volumes", "containers"},
+    "stacks": {"containers"},
+    "containers": {"containers"}
+}
+"""Record type of each snapshot field, used to restore the saved state"""
+SNAPSHOT_RECORDS = {
+    "images": ImageRecord,
+    "networks": NetworkRecord,
+    "unetworks": NetworkRecord,
+    "volumes": VolumeRecord,
+    "uvolumes": VolumeRecord,
+    "stacks": StackRecord,
+    "containers": ContainerRecord
+}
+STATE_VERSION = 1
+"""Snapshot fields owned by each resource check"""
+CHECK_FIELDS = {
+    "images": ("images",),
+    "networks": ("networks", "unetworks"),
+    "volumes": ("volumes", "uvolumes"),
+    "stacks": ("stacks",),
+    "containers": ("containers",)
+}
+DEFAULT_NETWORKS = {"none", "host", "bridge"}
+"""FILTERS entries that shape the snapshot fields of each resource check"""
+CHECK_FILTERS = {
+    "images": ("images",),
+    "networks": ("networks",),
+    "volumes": ("volumes",),
+    "stacks": ("containers", "stacks"),
+    "containers": ("containers",)
+}
+
+
+class FilterRules(NamedTuple):
+    """Name globs, labels (key or key=value) and stack globs of one include or exclude rule set, compiled once"""
+    names: tuple = ()
+    labels: tuple = ()
+    stacks: tuple = ()
+    names_pattern: re.Pattern = None
+    label_rules: tuple = ()
+    stacks_pattern: re.Pattern = None
+
+    @property
+    def empty(self) -> bool:
+        return not (self.names or self.labels or self.stacks)
+
+    def matches(self, names: tuple, labels: dict) -> bool:
+        """True when any name, label or stack rule matches the resource"""
+        if self.names_pattern and any(self.names_pattern.match(name) for name in names):
+            return True
+        if any(key in labels and (value is None or labels[key] == value) for key, value in self.label_rules):
+            return True
+        return bool(self.stacks_pattern and self.stacks_pattern.match(labels.get("com.docker.compose.project") or ""))
+
+
+class ResourceFilter(NamedTuple):
+    """Include/exclude rules of one resource type: kept when any include rule (or none) and no exclude rule matches"""
+    include: FilterRules = FilterRules()
+    exclude: FilterRules = FilterRules()
+
+    def matches(self, names: tuple, labels: dict) -> bool:
+        labels = labels or {}
+        if not self.include.empty and not self.include.matches(names, labels):
+            return False
+        return self.exclude.empty or not self.exclude.matches(names, labels)
+
+
+def compile_glob(patterns: tuple) -> re.Pattern:
+    """One regular expression matching any of the glob patterns"""
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns)) if patterns else None
+
+
+def compile_filter_rules(rules_config: dict) -> FilterRules:
+    names, labels, stacks = (tuple(str(rule) for rule in rules_config.get(key, [])) for key in ("NAMES", "LABELS", "STACKS"))
+    label_rules = tuple((label.split("=", 1)[0], label.split("=", 1)[1] if "=" in label else None) for label in labels)
+    return FilterRules(names, labels, stacks, compile_glob(names), label_rules, compile_glob(stacks))
+
+
+def compile_resource_filters(filters_config: dict) -> dict:
+    """Precompile the FILTERS of each resource type"""
+    resource_filters = {}
+    for resource, rules_config in (filters_config or {}).items():
+        if resource.lower() not in CHECK_TYPES:
+            logger.error(f"Unknown resource type '{resource}' in FILTERS, ignored.")
+            continue
+        resource_filters[resource.lower()] = ResourceFilter(
+            compile_filter_rules(rules_config.get("INCLUDE", {})), compile_filter_rules(rules_config.get("EXCLUDE", {}))
+        )
+    return resource_filters
+
+
+def glob_to_api_regex(pattern: str) -> str:
+    """Anchored Docker name filter expression of a glob, the leading slash of container names is optional"""
+    return "^/?" + "".join(".*" if char == "*" else "." if char == "?" else re.escape(char) for char in pattern) + "$"
+
+
+def get_api_filters(source: str) -> dict:
+    """Docker API filters for the include rules of a listing, only where the API returns exactly the matching resources or more.
+    Exclude rules and the remaining cases are applied by the precompiled matcher."""
+    resource_filter = resource_filters.get(source)
+    if not resource_filter:
+        return {}
+    include = resource_filter.include
+    if source == "containers" and enabled_checks & {"networks", "volumes"}:
+        """Unused networks and volumes are found from the full container list"""
+        return {}
+    if (bool(include.names) + bool(include.labels) + bool(include.stacks)) != 1:
+        return {}
+    if len(include.labels) == 1:
+        return {"label": list(include.labels)}
+    if source == "containers" and len(include.stacks) == 1 and not any(char in include.stacks[0] for char in "*?["):
+        return {"label": [f"com.docker.compose.project={include.stacks[0]}"]}
+    if source == "containers" and include.names and not any("[" in name for name in include.names):
+        return {"name": [glob_to_api_regex(name) for name in include.names]}
+    if source == "images" and include.names and not any(char in name for name in include.names for char in "*?["):
+        return {"reference": list(include.names)}
+    return {}
+
+
+def fetch_docker_source(docker_client, source: str, keys: set = None) -> list:
+    """Single Docker API listing of one resource type, narrowed by the API filters where possible, or to the given IDs or names"""
+    filters = get_api_filters(source) or None
+    if keys:
+        filters = {**(filters or {}), LISTING_KEYS[source][1]: sorted(keys)}
+    if source == "containers":
+        return docker_client.api.containers(all=True, filters=filters)
+    elif source == "images":
+        return docker_client.api.images(filters=filters)
+    elif source == "networks":
+        return docker_client.api.networks(filters=filters)
+    elif source == "volumes":
+        return docker_client.api.volumes(filters=filters).get("Volumes") or []
+    return []
+
+
+def filter_resources(resource: str, items: list, get_names) -> list:
+    """Apply the precompiled matcher of the resource type to raw listing items"""
+    resource_filter = resource_filters.get(resource)
+    if not resource_filter:
+        return items
+    return [item for item in items if resource_filter.matches(get_names(item), item.get("Labels"))]
+
+
+def derive_snapshot_data(raw: dict, previous: DockerSnapshot) -> dict:
+    """Build snapshot fields from the raw listings; a field is only built when all its sources were fetched"""
+    data = {}
+    all_containers = raw.get("containers")
+    if all_containers is not None:
+        containers = filter_resources("containers", all_containers, lambda container: tuple(name.lstrip("/") for name in container["Names"]))
+        running = [container for container in containers if container["State"] == "running"]
+        stacks = []
+        for container in filter_resources("stacks", running, lambda container: ((container.get("Labels") or {}).get("com.docker.compose.project") or "",)):
+            labels = container.get("Labels") or {}
+            if labels.get("com.docker.compose.project"):
+                stacks.append(StackRecord(labels["com.docker.compose.project"], str(labels.get("com.docker.compose.config-hash"))))
+        data["stacks"] = tuple(stacks)
+        """The list payload already carries state and health, no per-container inspect is needed"""
+        data["containers"] = tuple(
+            ContainerRecord(
+                container["Names"][0].lstrip("/"),
+                container["State"],
+                get_container_health(container.get("Status", "")) or container["State"],
+                container["Id"][:12]
+            ) for container in containers
+        ) if running else ()
+
+    if raw.get("images") is not None:
+        """Dangling images keep the name they had while tagged"""
+        previous_names = {image.short_id: image.name for image in previous.images}
+        images = []
+        image_names = lambda image: (*(tag.rsplit(":", 1)[0] for tag in image.get("RepoTags") or []), *(image.get("RepoTags") or []))
+        for image in filter_resources("images", raw["images"], image_names):
+            short_id = image["Id"].split(':')[-1][:10]
+            tags = tuple(sorted(tag for tag in image.get("RepoTags") or [] if tag != "<none>:<none>"))
+            digests = tuple(sorted(image.get("RepoDigests") or []))
+            images.append(ImageRecord(short_id, get_image_name(image) if tags else previous_names.get(short_id, short_id), tags, digests))
+        data["images"] = tuple(images)
+
+    if raw.get("networks") is not None:
+        networks = [network for network in raw["networks"] if network["Name"] not in DEFAULT_NETWORKS]
+        networks = filter_resources("networks", networks, lambda network: (network["Name"],))
+        data["networks"] = tuple(NetworkRecord(network["Name"], network["Id"][:12]) for network in networks)
+        if all_containers is not None:
+            used_networks = set()
+            for container in all_containers:
+                used_networks.update(((container.get("NetworkSettings") or {}).get("Networks") or {}).keys())
+            data["unetworks"] = tuple(record for record in data["networks"] if record.name not in used_networks)
+
+    if raw.get("volumes") is not None:
+        volumes = filter_resources("volumes", raw["volumes"], lambda volume: (volume["Name"],))
+        data["volumes"] = tuple(VolumeRecord(volume["Name"][:12]) for volume in volumes)
+        if all_containers is not None:
+            used_volumes = {mount.get("Name") for container in all_containers for mount in container.get("Mounts") or [] if mount.get("Type") == "volume"}
+            data["uvolumes"] = tuple(VolumeRecord(volume["Name"][:12]) for volume in volumes if volume["Name"] not in used_volumes)
+    return data
+
+
+def get_check_fingerprints() -> dict:
+    """Fingerprint of the FILTERS each enabled check is taken under, saved with the state to spot edits made while stopped"""
+    return {
+        check_type: hashlib.sha256(json.dumps([
+            [list(rules[:3]) for rules in resource_filters.get(resource, ResourceFilter())] for resource in CHECK_FILTERS[check_type]
+        ]).encode()).hexdigest()[:16]
+        for check_type in sorted(enabled_checks)
+    }
+
+
+def save_state(host: DockerHost):
+    """Atomically write the host snapshot to its versioned on-disk state file"""
+    state = {
+        "version": STATE_VERSION, "node": host.node_name, "saved": int(time.time()),
+        "checks": get_check_fingerprints(), "snapshot": host.snapshot._asdict()
+    }
+    try:
+        os.makedirs(os.path.dirname(host.state_file), exist_ok=True)
+        temp_file = f"{host.state_file}.tmp"
+        with open(temp_file, "w") as file:
+            json.dump(state, file, separators=(",", ":"))
+        os.replace(temp_file, host.state_file)
+    except (OSError, TypeError, ValueError) as e:
+        logger.error(f"Error saving state to {host.state_file}: {e}")
+
+
+def load_state(host: DockerHost) -> tuple:
+    """Load the snapshot saved by a previous run for this node, or None when there is no usable state,
+    and the enabled checks whose FILTERS or MONITORING_RESOURCES changed since it was saved"""
+    try:
+        with open(host.state_file, "r") as file:
+            state = json.load(file)
+        if state.get("version") != STATE_VERSION or state.get("node") != host.node_name:
+            logger.warning(f"State file {host.state_file} belongs to another version or node, ignoring it")
+            return None, set()
+        snapshot = DockerSnapshot(**{
+            field: tuple(record_type(*(tuple(value) if isinstance(value, list) else value for value in record)) for record in state["snapshot"].get(field, []))
+            for field, record_type in SNAPSHOT_RECORDS.items()
+        })
+        """State saved before fingerprints were recorded is trusted as it is"""
+        saved_checks = state.get("checks")
+        stale_checks = {check_type for check_type, fingerprint in get_check_fingerprints().items() if saved_checks.get(check_type) != fingerprint} if saved_checks is not None else set()
+        return snapshot, stale_checks
+    except FileNotFoundError:
+        return None, set()
+    except (OSError, json.JSONDecodeError, TypeError, ValueError, KeyError, AttributeError) as e:
+        logger.error(f"Error loading state from {host.state_file}: {e}")
+        return None, set()
+
+
+def fetch_docker_changes(host: DockerHost, source: str) -> list:
+    """Events mode listing: only the resources named by events since the last fetch are relisted and merged into the cached listing.
+    A first fetch, image events, reconnects and the reconciliation relist everything"""
+    key, _ = LISTING_KEYS.get(source, ("", ""))
+    with pending_checks_lock:
+        full = not key or source in host.full_sources or source not in host.listings
+        changed = host.changed_ids.pop(source, set())
+        host.full_sources.discard(source)
+    try:
+        if full:
+            items = docker_request(host, lambda docker_client: fetch_docker_source(docker_client, source))
+            if not key:
+                return items
+            host.listings[source] = {item[key]: item for item in items}
+        elif changed:
+            items = docker_request(host, lambda docker_client: fetch_docker_source(docker_client, source, changed))
+            listing = {item_key: item for item_key, item in host.listings[source].items() if item_key not in changed}
+            listing.update({item[key]: item for item in items if item[key] in changed})
+            host.listings[source] = listing
+    except Exception:
+        with pending_checks_lock:
+            host.full_sources.add(source)
+        raise
+    return list(host.listings[source].values())
+
+
+def submit_fetch(func, *args):
+    """Run a fetch task on the fetch pool, counted in the submitting cycle and under its own profiler while a cycle is profiled.
+    From Python 3.12 one cProfile covers every thread and a second one cannot be enabled, so the cycle profile already has the fetches"""
+    cycle_calls = getattr(api_call_context, "calls", None)
+    if profile_cycles and profile_lock.locked() and sys.version_info < (3, 12):
+        return fetch_executor.submit(run_counted_fetch, cycle_calls, run_profiled_fetch, func, *args)
+    return fetch_executor.submit(run_counted_fetch, cycle_calls, func, *args)
+
+
+def run_counted_fetch(cycle_calls: Counter, func, *args):
+    """Run a fetch task with the API call counter of the cycle that submitted it"""
+    api_call_context.calls = cycle_calls
+    try:
+        return func(*args)
+    finally:
+        api_call_context.calls = None
 
-    except (docker.errors.DockerException, Exception) as e:
-        logger.error(f"Error retrieving Docker {data_type}: {e}")
+
+def run_profiled_fetch(func, *args):
+    """cProfile only sees the thread it is enabled on, so the API round-trips and JSON decoding of a fetch worker get their own profiler"""
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args)
     finally:
-        if docker_client:
-            docker_client.close()
+        fetch_profilers.append(profiler)
+
 
-    return tuple(resource_data)
+def submit_docker_fetches(host: DockerHost, sources: set) -> dict:
+    """Start the listings concurrently, reusing a listing still running from a previous cycle"""
+    futures = {}
+    for source in sources:
+        if source in host.pending_fetches:
+            pass
+        elif events_mode:
+            host.pending_fetches[source] = submit_fetch(fetch_docker_changes, host, source)
+        else:
+            host.pending_fetches[source] = submit_fetch(docker_request, host, lambda docker_client, source=source: fetch_docker_source(docker_client, source))
+        futures[host.pending_fetches[source]] = source
+    return futures
 
 
+def iter_docker_snapshots(host: DockerHost, check_types: set, previous: DockerSnapshot):
+    """Yield the checks that became ready and the snapshot built so far, as soon as their sources are fetched"""
+    futures = submit_docker_fetches(host, set().union(*(CHECK_SOURCES[check_type] for check_type in check_types)))
+    waiting_checks, raw = set(check_types), {}
+    try:
+        for future in as_completed(futures, timeout=fetch_timeout):
+            source = futures[future]
+            host.pending_fetches.pop(source, None)
+            try:
+                raw[source] = future.result()
+            except (docker.errors.DockerException, Exception) as e:
+                logger.error(f"Error retrieving Docker {source} of {host.node_name or host.base_url}: {e}")
+                continue
+            ready_checks = {check_type for check_type in waiting_checks if CHECK_SOURCES[check_type] <= raw.keys()}
+            if ready_checks:
+                waiting_checks -= ready_checks
+                yield ready_checks, previous._replace(**derive_snapshot_data(raw, previous))
+    except FetchTimeoutError:
+        slow_sources = sorted(source for future, source in futures.items() if not future.done())
+        logger.warning(f"Docker {', '.join(slow_sources)} listing of {host.node_name} exceeded {fetch_timeout} seconds, it will be used in the next cycle")
+
+
+def take_docker_snapshot(host: DockerHost, check_types: set, previous: DockerSnapshot = None) -> DockerSnapshot:
+    """Fetch every resource type needed by the checks once and derive all check data from that single fetch"""
+    snapshot = previous or DockerSnapshot()
+    for _, snapshot in iter_docker_snapshots(host, check_types, previous or DockerSnapshot()):
+        pass
+    return snapshot
+
+
+def diff_images(old: DockerSnapshot, new: DockerSnapshot) -> str:
+    """Describe pulled, retagged, now unused (dangling) and removed images in one pass over ID-keyed maps"""
+    if not old.images:
+        return ""
+
+    old_images = {image.short_id: image for image in old.images}
+    new_images = {image.short_id: image for image in new.images}
+    changes = []
+
+    for image_id, image in new_images.items():
+        previous = old_images.get(image_id)
+        if previous is None:
+            if not image.dangling:
+                changes.append((image, yellow_dot, "pulled"))
+        elif image.dangling and not previous.dangling:
+            changes.append((image, orange_dot, "unused"))
+        elif not image.dangling and image.tags != previous.tags:
+            changes.append((image, yellow_dot, "retagged"))
+
+    for image_id, image in old_images.items():
+        if image_id not in new_images:
+            changes.append((image, red_dot, "removed"))
+
+    """Group by name so a re-pulled image shows its old version as unused next to the pulled one"""
+    status_order = {"unused": 0, "removed": 1, "retagged": 2, "pulled": 3}
+    changes.sort(key=lambda change: (change[0].name, status_order[change[2]], change[0].short_id))
+    return "\n".join(
+        f"{status_dot} *{image.name}*{'' if compact_format else f' ({image.short_id})'}: {status_message}!"
+        for image, status_dot, status_message in changes
+    )
+
+
+def diff_resources(old_list: tuple, new_list: tuple, check_type: str) -> str:
+    """Describe created and removed networks and volumes, both in the same pass"""
+    message = ""
+    if not new_list:
+        return ""
+
+    old_list = old_list or new_list
+    for status_dot, status_message, result in (
+        (yellow_dot, "created", set(new_list) - set(old_list)),
+        (red_dot, "removed", set(old_list) - set(new_list))
+    ):
+        for item in result:
+            item_detail = f" ({item.short_id})" if check_type != "volumes" and not compact_format else ""
+            message += f"{status_dot} *{item.name}*{item_detail}: {status_message}!\n"
+    return "\n".join(sorted(message.splitlines()))
+
+
+def diff_unused_resources(old_list: tuple, new_list: tuple, check_type: str) -> str:
+    """Describe networks and volumes that became unused"""
+    status_message, status_dot, message = "unused", orange_dot, ""
+    for item in set(new_list) - set(old_list):
+        item_detail = f" ({item.short_id})" if check_type != "volumes" and not compact_format else ""
+        message += f"{status_dot} *{item.name}*{item_detail}: {status_message}!\n"
+    return "\n".join(sorted(message.splitlines()))
+
+
+def diff_stacks(old: DockerSnapshot, new: DockerSnapshot) -> str:
+    """Describe created, removed and changed compose stacks"""
+    message = ""
+    status_created, status_removed, status_changed = yellow_dot, red_dot, orange_dot
+    status_created_msg, status_removed_msg, status_changed_msg = "created", "removed", "changed"
+
+    current_stacks = dict(new.stacks)
+    old_stacks = dict(old.stacks)
+
+    created = set(current_stacks) - set(old_stacks)
+    removed = set(old_stacks) - set(current_stacks)
+    common = set(current_stacks) & set(old_stacks)
+
+    for name in sorted(created):
+        stack_hash = current_stacks[name]
+        message += f"{status_created} *{name}*{'' if compact_format else f' ({stack_hash[:12]})'}: {status_created_msg}!\n"
+
+    for name in sorted(removed):
+        stack_hash = old_stacks[name]
+        message += f"{status_removed} *{name}*{'' if compact_format else f' ({stack_hash[:12]})'}: {status_removed_msg}!\n"
+
+    for name in sorted(common):
+        if current_stacks[name] != old_stacks[name]:
+            stack_hash = current_stacks[name]
+            message += f"{status_changed} *{name}*{'' if compact_format else f' ({stack_hash[:12]})'}: {status_changed_msg}!\n"
 
-def send_message(message: str):
-    """Internal function to send HTTP POST requests with error handling"""
-    def send_request(url, json_data=None, data=None, headers=None):
+    return message.strip()
+
+
+def diff_containers(old: DockerSnapshot, new: DockerSnapshot, held: set = frozenset()) -> str:
+    """Describe container state and health changes and removed containers, except those held back by the health tracker"""
+    status_dot, message = orange_dot, ""
+    list_containers, old_list_containers = new.containers, old.containers or new.containers
+
+    if not list_containers:
+        return ""
+
+    """A container whose state changed is in both differences, only its new state is reported"""
+    current_ids = {container.short_id for container in list_containers}
+    result = [(container, False) for container in set(list_containers) - set(old_list_containers)]
+    result += [(container, True) for container in set(old_list_containers) - set(list_containers) if container.short_id not in current_ids]
+
+    for (container_name, container_status, container_attr, container_id), inactive in result:
+        if "_" in container_name:
+            prefix, suffix = container_name.split("_", 1)
+            if is_hex(prefix):
+                continue
+
+        if container_attr == "starting" or container_id in held:
+            continue
+
+        if inactive:
+            container_status = "inactive"
+            status_dot = red_dot
+
+        elif container_status == "running":
+            status_dot = orange_dot if container_attr == "unhealthy" else green_dot
+            if container_attr != container_status:
+                container_status = container_attr
+        elif container_status == "created":
+            status_dot = yellow_dot
+
+        message += (
+            f"{status_dot} *{container_name}*"
+            f"{'' if compact_format else f' ({container_id})'}: {container_status}!\n"
+        )
+
+        status_dot = orange_dot
+    return "\n".join(sorted(message.splitlines()))
+
+
+def observe_metric(name: str, labels: tuple, value: float):
+    """Record a value in the histogram metric with the given labels"""
+    with metrics_lock:
+        histogram = metric_histograms.setdefault((name, labels), [[0] * len(METRICS_BUCKETS), 0.0, 0])
+        for index, bucket in enumerate(METRICS_BUCKETS):
+            if value <= bucket:
+                histogram[0][index] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+def inc_metric(name: str, labels: tuple, value: int = 1):
+    """Increase the counter metric with the given labels"""
+    with metrics_lock:
+        metric_counters[(name, labels)] += value
+
+
+def format_metric_labels(labels: tuple) -> str:
+    """Format metric labels in the Prometheus text exposition format"""
+    escaped = (f'{key}="{str(value).translate(METRICS_LABEL_ESCAPES)}"' for key, value in labels)
+    return f"{{{','.join(escaped)}}}" if labels else ""
+
+
+def render_metrics() -> str:
+    """Render the live gauges of every Docker host, the histograms and the counters"""
+    samples = {name: [] for name in METRICS}
+    for host in docker_hosts:
+        node, snapshot = ("node", host.node_name), host.snapshot
+        for resource, count in snapshot.get_counts().items():
+            samples["dockcheck_resources"].append((format_metric_labels((node, ("resource", resource))), count))
+        for resource in ("networks", "volumes"):
+            samples["dockcheck_unused_resources"].append((format_metric_labels((node, ("resource", resource))), len(getattr(snapshot, f"u{resource}"))))
+        for container in snapshot.containers:
+            samples["dockcheck_container_state"].append((format_metric_labels((node, ("container", container.name), ("state", container.status))), 1))
+            if container.health in ("healthy", "unhealthy", "starting"):
+                samples["dockcheck_container_health"].append((format_metric_labels((node, ("container", container.name), ("health", container.health))), 1))
+        now = time.monotonic()
+        with host.health.lock:
+            for entry in host.health.containers.values():
+                container = ("container", entry.name)
+                for state, seconds in {**entry.state_time, entry.state: entry.state_time.get(entry.state, 0) + now - entry.since}.items():
+                    samples["dockcheck_container_state_seconds_total"].append((format_metric_labels((node, container, ("state", state))), round(seconds, 3)))
+                samples["dockcheck_container_restarts"].append((format_metric_labels((node, container)), entry.restarts))
+                samples["dockcheck_container_flapping"].append((format_metric_labels((node, container)), int(entry.flapping)))
+        samples["dockcheck_image_updates"].append((format_metric_labels((node,)), len(host.image_updates)))
+        for entry in list(host.stats.values()):
+            if entry.samples:
+                _, cpu_percent, memory_percent = entry.samples[-1]
+                samples["dockcheck_container_cpu_percent"].append((format_metric_labels((node, ("container", entry.name))), round(cpu_percent, 2)))
+                samples["dockcheck_container_memory_percent"].append((format_metric_labels((node, ("container", entry.name))), round(memory_percent, 2)))
+    for sender, platform_queue in platform_channels:
+        samples["dockcheck_send_queue_messages"].append((format_metric_labels((("platform", urlparse(sender.url).netloc),)), platform_queue.qsize()))
+
+    with metrics_lock:
+        for (name, labels), (buckets, total, count) in metric_histograms.items():
+            for bucket, bucket_count in zip(METRICS_BUCKETS, buckets):
+                samples[name].append((f"_bucket{format_metric_labels((*labels, ('le', bucket)))}", bucket_count))
+            samples[name].append((f"_bucket{format_metric_labels((*labels, ('le', '+Inf')))}", count))
+            samples[name].append((f"_sum{format_metric_labels(labels)}", round(total, 6)))
+            samples[name].append((f"_count{format_metric_labels(labels)}", count))
+        for (name, labels), value in metric_counters.items():
+            samples[name].append((format_metric_labels(labels), value))
+
+    lines = []
+    for name, (metric_type, description) in METRICS.items():
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"]
+        lines += [f"{name}{suffix} {value}" for suffix, value in samples[name]]
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(address: str, port: int):
+    """Serve the metrics endpoint from a background thread, http.server is only loaded when metrics are enabled"""
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """Serve the Prometheus metrics on /metrics and the event history on /history"""
+        def do_GET(self):
+            path, _, query = self.path.partition("?")
+            if path == "/history" and history_file:
+                try:
+                    body, content_type = json.dumps(get_history_events(parse_qs(query))).encode("utf-8"), "application/json"
+                except ValueError as e:
+                    self.send_error(400, str(e))
+                    return
+                except Exception as e:
+                    logger.error(f"Error reading the event history: {e}")
+                    self.send_error(500)
+                    return
+            elif path == "/metrics":
+                body, content_type = render_metrics().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(f"Metrics request from {self.address_string()}: {format % args}")
+
+    try:
+        server = ThreadingHTTPServer((address, port), MetricsHandler)
+    except OSError as e:
+        logger.error(f"Error starting the metrics endpoint on {address}:{port}: {e}")
+        return
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+def get_retry_after(response) -> float:
+    """Seconds requested by a Retry-After header, either delta-seconds or an HTTP date"""
+    retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+    if retry_after.isdigit():
+        return float(retry_after)
+    try:
+        return max((parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds(), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def send_request(session, url, json_data=None, data=None, headers=None) -> bool:
+    """Internal function to send HTTP POST requests with retries, exponential backoff and error handling"""
+    backoff = 1
+    for attempt in range(1, send_retries + 1):
+        response = None
+        started = time.perf_counter()
         try:
-            response = requests.post(url, json=json_data, data=data, headers=headers, timeout=(3, 6))
+            response = session.post(url, json=json_data, data=data, headers=headers, timeout=(3, 6))
+            observe_metric("dockcheck_send_duration_seconds", (("platform", urlparse(url).netloc),), time.perf_counter() - started)
             response.raise_for_status()
             logger.info(f"Message successfully sent to {cut_message_url(url)}. Status code: {response.status_code}")
+            return True
         except requests.exceptions.RequestException as e:
-            logger.error(f"Error sending message to {cut_message_url(url)}: {e}")
-
-    """"Converts Markdown-like syntax to HTML format."""
-    def to_HTML_format(message: str) -> str:
-        message = ''.join(f"<b>{part}</b>" if i % 2 else part for i, part in enumerate(message.split('*')))
-        return message.replace("\n", "<br>")
-
-    """Converts the message to the specified format (HTML, Markdown, or plain text)"""
-    def to_markdown_format(message: str, m_format: str) -> str:
-        if m_format == "html":
-            return to_HTML_format(message)
-        elif m_format == "markdown":
-            return message.replace("*", "**")
-        elif m_format == "text":
-            return message.replace("*", "")
-        elif m_format == "simplified":
-            return message
-        else:
-            logger.error(f"Unknown format '{m_format}' provided. Returning original message.")
-            return message
-
-    """Iterate through multiple platform configurations"""
-    for url, header, payload, format_message in zip(platform_webhook_url, platform_header, platform_payload, platform_format_message):
-        data, ntfy = None, False
-        formated_message = to_markdown_format(message, format_message)
-        header_json = header if header else None
-        
-        for key in list(payload.keys()):
-            if key == "title":
-                delimiter = "<br>" if format_message == "html" else "\n"
-                header, formated_message = formated_message.split(delimiter, 1)
-                payload[key] = header.replace("*", "")
-            elif key == "extras":
+            retryable = response is None or response.status_code == 429 or response.status_code >= 500
+            if response is None:
+                observe_metric("dockcheck_send_duration_seconds", (("platform", urlparse(url).netloc),), time.perf_counter() - started)
+            if not retryable or attempt == send_retries:
+                logger.error(f"Error sending message to {cut_message_url(url)}: {e}")
+                inc_metric("dockcheck_send_failures_total", (("platform", urlparse(url).netloc),))
+                return False
+            delay = min(get_retry_after(response) or backoff, SEND_MAX_BACKOFF)
+            logger.warning(f"Error sending message to {cut_message_url(url)}: {e}. Retry {attempt}/{send_retries - 1} in {delay:.0f} seconds")
+            time.sleep(delay)
+            backoff *= 2
+    return False
+
+
+"""Converts Markdown-like syntax (*bold*) to the format of each messaging platform"""
+MARKDOWNV2_ESCAPE = re.compile(r"([_*\[\]()~`>#+\-=|{}.!\\])")
+MESSAGE_FORMATTERS = {
+    "html": lambda message: "".join(f"<b>{part}</b>" if i % 2 else part for i, part in enumerate(message.split("*"))).replace("\n", "<br>"),
+    "markdown": lambda message: message.replace("*", "**"),
+    "markdownv2": lambda message: "".join(
+        f"*{part}*" if i % 2 else part for i, part in enumerate(MARKDOWNV2_ESCAPE.sub(r"\\\1", part) for part in message.split("*"))
+    ),
+    "mrkdwn": lambda message: message.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;"),
+    "text": lambda message: message.replace("*", ""),
+    "simplified": lambda message: message
+}
+MESSAGE_KEYS = {"text", "content", "message", "body", "formatted_body", "data"}
+
+
+class PlatformSender(NamedTuple):
+    """Messaging platform configuration compiled once at startup into an immutable request builder"""
+    url: str
+    headers: dict
+    formatter: Callable
+    title_delimiter: str
+    payload_plan: tuple
+    raw_data: bool
+
+    def build_request(self, message: str) -> tuple:
+        """Build a fresh JSON payload, raw data and headers of one request from the payload template"""
+        formated_message = self.formatter(message)
+        payload = {}
+        for key, value, role in self.payload_plan:
+            if role == "title":
+                header, formated_message = formated_message.split(self.title_delimiter, 1)
+                value = header.replace("*", "")
+            elif role == "extras":
                 formated_message = formated_message.replace("\n", "\n\n")
                 payload["message"] = formated_message
-            elif key == "data":
-                ntfy = True
-            payload[key] = formated_message if key in ["text", "content", "message", "body", "formatted_body", "data"] else payload[key]
+            elif role == "message":
+                value = formated_message
+            payload[key] = value
+        if self.raw_data:
+            return None, formated_message.encode("utf-8"), self.headers
+        return payload, None, self.headers
+
+
+def compile_platform_sender(url: str, header, payload: dict, format_message: str) -> PlatformSender:
+    """Resolve the formatter and the role of every payload key of one messaging platform"""
+    formatter = MESSAGE_FORMATTERS.get(format_message)
+    if formatter is None:
+        logger.error(f"Unknown format '{format_message}' provided for {cut_message_url(url)}. The original message will be used.")
+        formatter = MESSAGE_FORMATTERS["simplified"]
+    payload_plan = tuple(
+        (key, value, "title" if key == "title" else "extras" if key == "extras" else "message" if key in MESSAGE_KEYS else "static")
+        for key, value in payload.items()
+    )
+    return PlatformSender(
+        url, header if header else None, formatter, "<br>" if format_message == "html" else "\n", payload_plan, "data" in payload
+    )
+
+
+def platform_sender(sender: PlatformSender, platform_queue: queue.Queue):
+    """Deliver the queued messages of one messaging platform over a pooled HTTP session, until a None stops it"""
+    session = requests.Session()
+    while True:
+        message = platform_queue.get()
+        if message is None:
+            break
+        try:
+            send_request(session, sender.url, *sender.build_request(message))
+        except Exception as e:
+            logger.error(f"Error sending message to {cut_message_url(sender.url)}: {e}")
+    session.close()
+
+
+def compile_platform_senders(platform_settings: dict) -> list:
+    """Senders of the messaging platforms in the platform_* lists, raising on settings that cannot be sent with"""
+    return [compile_platform_sender(*settings) for settings in zip(*(platform_settings[platform_key] for platform_key in PLATFORM_KEYS))]
+
+
+def start_platform_senders(senders: list = None):
+    """Start one bounded queue and sender thread per messaging platform, so a slow endpoint never blocks the others.
+    On reload a platform with unchanged settings keeps its queue, thread and HTTP session"""
+    global platform_channels
+    channels, previous_channels = [], list(platform_channels)
+    for sender in compile_platform_senders(globals()) if senders is None else senders:
+        channel = next((channel for channel in previous_channels if channel[0] == sender), None)
+        if channel:
+            previous_channels.remove(channel)
+        else:
+            channel = (sender, queue.Queue(maxsize=send_queue_size))
+            threading.Thread(target=platform_sender, args=channel, daemon=True).start()
+        channels.append(channel)
+    platform_channels = tuple(channels)
+    for sender, platform_queue in previous_channels:
+        """A removed platform still delivers the messages queued before the reload"""
+        queue_message(sender, platform_queue, None)
+
+
+def queue_message(sender: PlatformSender, platform_queue: queue.Queue, message):
+    """Queue without blocking, dropping the oldest message when the queue is full"""
+    while True:
+        try:
+            platform_queue.put_nowait(message)
+            break
+        except queue.Full:
+            try:
+                platform_queue.get_nowait()
+                logger.warning(f"Message queue for {cut_message_url(sender.url)} is full, the oldest message was dropped")
+            except queue.Empty:
+                pass
+
+
+def send_message(message: str):
+    """Queue the message for every messaging platform without blocking the monitoring loop"""
+    for sender, platform_queue in platform_channels:
+        queue_message(sender, platform_queue, message)
+
+
+def check_resource(host: DockerHost, check_type: str, old: DockerSnapshot, new: DockerSnapshot) -> list:
+    """Diff one resource check between two snapshots and return the resulting messages"""
+    messages = []
+    if check_type == "images":
+        messages.append(diff_images(old, new))
+    elif check_type in {"networks", "volumes"}:
+        messages.append(diff_resources(getattr(old, check_type), getattr(new, check_type), check_type))
+        messages.append(diff_unused_resources(getattr(old, f"u{check_type}"), getattr(new, f"u{check_type}"), check_type))
+    elif check_type == "stacks":
+        messages.append(diff_stacks(old, new))
+    elif check_type == "containers":
+        held, health_messages = host.health.update(old.containers, new.containers)
+        messages.append(diff_containers(old, new, held))
+        messages.extend(health_messages)
+    return [message for message in messages if message]
+
+
+def notify(node_name: str, check_type: str, message: str):
+    """Send a check message, or merge it into the node digest while a coalescing window is open"""
+    global digest_timer
+    if history_file:
+        record_history(node_name, check_type, message)
+    if not coalesce_sec:
+        send_message(f"*{node_name}* (.{check_type})\n{message}")
+        return
+
+    with digest_lock:
+        digest_stats["messages"] += 1
+        digest_stats["bytes"] += len(f"*{node_name}* (.{check_type})\n{message}".encode("utf-8"))
+        section = digest.setdefault(node_name, {}).setdefault(check_type, {})
+        for line in message.splitlines():
+            """A later state of the same container or stack replaces the earlier one, collapsing flapping"""
+            item = line.split(" ", 1)[-1].rsplit(":", 1)[0] if check_type in COLLAPSE_CHECKS else line
+            section.pop(item, None)
+            section[item] = line
+        if digest_timer is None:
+            digest_timer = threading.Timer(coalesce_sec, flush_digest)
+            digest_timer.daemon = True
+            digest_timer.start()
+
+
+def flush_digest():
+    """Send the changes collected during the coalescing window as one digest message per node"""
+    global digest_timer
+    with digest_lock:
+        nodes = dict(digest)
+        messages, message_bytes = digest_stats["messages"], digest_stats["bytes"]
+        digest.clear()
+        digest_stats.update(messages=0, bytes=0)
+        digest_timer = None
+
+    for digest_node, sections in nodes.items():
+        check_types = [check_type for check_type in DIGEST_SECTIONS if sections.get(check_type)]
+        if not check_types:
+            continue
+        header_message = f"*{digest_node}* ({', '.join(f'.{check_type}' for check_type in check_types)})\n"
+        message = "\n".join(line for check_type in check_types for line in sections[check_type].values())
+        send_message(f"{header_message}{message}")
+        digest_bytes = len(f"{header_message}{message}".encode("utf-8"))
+        digest_totals["messages"] += messages
+        digest_totals["sends"] += 1
+        digest_totals["bytes"] += message_bytes
+        digest_totals["digest_bytes"] += digest_bytes
+        logger.info(
+            f"Digest for {digest_node}: {messages} messages merged into 1 ({message_bytes} -> {digest_bytes} bytes), "
+            f"total: {digest_totals['messages']} -> {digest_totals['sends']} sends, "
+            f"{digest_totals['bytes']} -> {digest_totals['digest_bytes']} bytes"
+        )
+        messages = message_bytes = 0
+
+
+HISTORY_BATCH = 1000
+HISTORY_FLUSH_SEC = 1
+HISTORY_PRUNE_SEC = 60
+HISTORY_QUERY_LIMIT = 10000
+HISTORY_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+HISTORY_LINE = re.compile(r"^\S+ \*(?P<name>.+?)\*(?: \((?P<short_id>[^)]*)\))?: (?P<event>.*?)!?$")
+HISTORY_COLUMNS = ("time", "node", "type", "name", "short_id", "event")
+HISTORY_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY, time INTEGER NOT NULL, node TEXT NOT NULL, type TEXT NOT NULL, "
+    "name TEXT NOT NULL, short_id TEXT NOT NULL, event TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS events_time ON events (time)",
+    "CREATE INDEX IF NOT EXISTS events_node_time ON events (node, time)",
+    "CREATE INDEX IF NOT EXISTS events_type_time ON events (type, time)",
+    "CREATE INDEX IF NOT EXISTS events_name_time ON events (name, time)"
+)
+history_queue = queue.Queue(maxsize=HISTORY_BATCH * 10)
+
+
+def record_history(node_name: str, check_type: str, message: str):
+    """Queue the changes of a message for the history writer, the monitoring loop never waits for the disk"""
+    now = int(time.time())
+    for line in message.splitlines():
+        match = HISTORY_LINE.match(line)
+        name, short_id, event = match.group("name", "short_id", "event") if match else ("", "", line)
+        try:
+            history_queue.put_nowait((now, node_name, check_type, name, short_id or "", event))
+        except queue.Full:
+            logger.warning(f"Event history queue is full, changes of {node_name} (.{check_type}) were not recorded")
+            return
+
+
+def open_history(path: str, read_only: bool = False):
+    """Open the event history in WAL mode, so queries never block the writer; sqlite3 is only loaded when the history is enabled"""
+    import sqlite3
+    if read_only:
+        return sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    for statement in HISTORY_SCHEMA:
+        connection.execute(statement)
+    connection.commit()
+    return connection
+
+
+def history_writer(connection):
+    """Write the queued events in batches of one transaction and keep the store within HISTORY_MAX_EVENTS, oldest first"""
+    import sqlite3
+    pruned = time.monotonic()
+    while True:
+        batch, deadline = [history_queue.get()], time.monotonic() + HISTORY_FLUSH_SEC
+        while len(batch) < HISTORY_BATCH:
+            try:
+                batch.append(history_queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        try:
+            with connection:
+                connection.executemany("INSERT INTO events (time, node, type, name, short_id, event) VALUES (?, ?, ?, ?, ?, ?)", batch)
+                if history_max_events and time.monotonic() - pruned >= HISTORY_PRUNE_SEC:
+                    connection.execute("DELETE FROM events WHERE id <= (SELECT max(id) FROM events) - ?", (history_max_events,))
+                    pruned = time.monotonic()
+        except sqlite3.Error as e:
+            logger.error(f"Error writing {len(batch)} events to the event history {history_file}: {e}")
+
+
+def start_history_writer() -> bool:
+    """Open the event history and start its writer thread; False when it cannot be opened"""
+    import sqlite3
+    try:
+        connection = open_history(history_file)
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"Error opening the event history {history_file}: {e}")
+        return False
+    threading.Thread(target=history_writer, args=(connection,), daemon=True).start()
+    return True
+
+
+def parse_history_time(value: str) -> int:
+    """Unix time of a query bound: seconds since the epoch, an ISO date or an age such as 30m, 12h or 7d"""
+    value = value.strip()
+    if value[:-1].isdigit() and value[-1:] in HISTORY_PERIODS:
+        return int(time.time()) - int(value[:-1]) * HISTORY_PERIODS[value[-1]]
+    if value.isdigit():
+        return int(value)
+    moment = datetime.fromisoformat(value)
+    return int((moment if moment.tzinfo else moment.astimezone()).timestamp())
+
+
+def query_history(connection, node: str = "", check_type: str = "", name: str = "", since: int = None, until: int = None, limit: int = 100) -> list:
+    """Latest events matching the filters, newest first; each filter is answered from an index, names accept globs"""
+    conditions, params = [], []
+    for condition, value in (("node = ?", node), ("type = ?", check_type), ("name GLOB ?", name), ("time >= ?", since), ("time < ?", until)):
+        if value not in ("", None):
+            conditions.append(condition)
+            params.append(value)
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+    rows = connection.execute(
+        f"SELECT {', '.join(HISTORY_COLUMNS)} FROM events {where}ORDER BY time DESC, id DESC LIMIT ?",
+        (*params, min(max(int(limit), 1), HISTORY_QUERY_LIMIT))
+    ).fetchall()
+    return [dict(zip(HISTORY_COLUMNS, row)) for row in rows]
+
+
+def get_history_events(params: dict) -> list:
+    """Events for the /history query parameters node, type, name, since, until and limit, with ISO timestamps"""
+    param = lambda key: params.get(key, [""])[0]
+    connection = open_history(history_file, read_only=True)
+    try:
+        events = query_history(
+            connection, param("node"), param("type"), param("name"),
+            parse_history_time(param("since")) if param("since") else None,
+            parse_history_time(param("until")) if param("until") else None,
+            param("limit") or 100
+        )
+    finally:
+        connection.close()
+    for event in events:
+        event["time"] = datetime.fromtimestamp(event["time"], timezone.utc).isoformat()
+    return events
+
+
+DOCKER_HUB_REGISTRY = "registry-1.docker.io"
+REGISTRY_ACCEPT = ", ".join((
+    "application/vnd.oci.image.index.v1+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+    "application/vnd.docker.distribution.manifest.v2+json",
+    "application/vnd.oci.image.manifest.v1+json"
+))
+REGISTRY_CHALLENGE = re.compile(r'(\w+)="([^"]*)"')
+"""Registry digest cache per repository tag: (registry, repository, tag) -> (digest, etag, checked)"""
+registry_cache = {}
+registry_tokens = {}
+registry_lock = threading.Lock()
+
+
+def parse_image_reference(reference: str) -> tuple:
+    """Split an image reference into registry, repository and tag, with the Docker Hub defaults"""
+    name = reference.partition("@")[0]
+    if ":" in name.rsplit("/", 1)[-1]:
+        name, _, tag = name.rpartition(":")
+    else:
+        tag = "latest"
+    first, _, rest = name.partition("/")
+    if rest and ("." in first or ":" in first or first == "localhost"):
+        registry, repository = first, rest
+    else:
+        registry, repository = DOCKER_HUB_REGISTRY, name
+    if registry == DOCKER_HUB_REGISTRY and "/" not in repository:
+        repository = f"library/{repository}"
+    return registry, repository, tag or "latest"
+
+
+def get_registry_token(session, registry: str, repository: str, challenge: str) -> str:
+    """Anonymous pull token for the repository from the registry's Bearer challenge, cached until it expires"""
+    params = dict(REGISTRY_CHALLENGE.findall(challenge))
+    realm = params.pop("realm", "")
+    if not challenge.lower().startswith("bearer") or not realm:
+        return ""
+    params.setdefault("scope", f"repository:{repository}:pull")
+    response = session.get(realm, params=params, timeout=(3, 10))
+    inc_metric("dockcheck_registry_requests_total", (("registry", registry), ("request", "token"), ("status", str(response.status_code))))
+    response.raise_for_status()
+    token_json = response.json()
+    token = token_json.get("token") or token_json.get("access_token", "")
+    with registry_lock:
+        registry_tokens[(registry, repository)] = (token, time.monotonic() + max(int(token_json.get("expires_in", 300)) - 30, 30))
+    return token
+
+
+def fetch_registry_digest(session, registry: str, repository: str, tag: str) -> str:
+    """Digest of a repository tag from a HEAD request, answered from the cache within UPDATE_CACHE_SEC or revalidated with its ETag"""
+    now = time.monotonic()
+    with registry_lock:
+        cached = registry_cache.get((registry, repository, tag))
+        token, expires = registry_tokens.get((registry, repository), ("", 0))
+    if cached and now - cached[2] < update_cache_sec:
+        return cached[0]
+
+    url = f"{'http' if registry in insecure_registries else 'https'}://{registry}/v2/{repository}/manifests/{tag}"
+    headers = {"Accept": REGISTRY_ACCEPT}
+    if cached and cached[1]:
+        headers["If-None-Match"] = cached[1]
+    for attempt in range(2):
+        if token and expires > now:
+            headers["Authorization"] = f"Bearer {token}"
+        response = session.head(url, headers=headers, timeout=(3, 10))
+        inc_metric("dockcheck_registry_requests_total", (("registry", registry), ("request", "manifest"), ("status", str(response.status_code))))
+        if response.status_code != 401 or attempt:
+            break
+        token, expires = get_registry_token(session, registry, repository, response.headers.get("WWW-Authenticate", "")), now + 30
+        if not token:
+            break
+
+    if response.status_code == 304 and cached:
+        digest, etag = cached[0], cached[1]
+    else:
+        response.raise_for_status()
+        digest, etag = response.headers.get("Docker-Content-Digest", ""), response.headers.get("ETag", "")
+    with registry_lock:
+        registry_cache[(registry, repository, tag)] = (digest, etag, now)
+    return digest
 
-        payload_json = None if ntfy else payload
-        data = formated_message.encode("utf-8") if ntfy else None
 
-        """Send the request with the appropriate payload and headers"""
-        send_request(url, payload_json, data, header_json)
+def check_image_updates():
+    """Compare the digests of the image tags used by running containers with their registries, one request per repository tag"""
+    references = {}
+    for host in docker_hosts:
+        try:
+            running = docker_request(host, lambda docker_client: docker_client.api.containers(filters={"status": "running"}))
+        except (docker.errors.DockerException, Exception) as e:
+            logger.error(f"Error listing running containers of {host.node_name or host.base_url}: {e}")
+            continue
+        running_images = {container.get("ImageID", "").split(":")[-1][:10] for container in running}
+        for image in host.snapshot.images:
+            """Images built locally or pulled by digest have no repository digest to compare"""
+            if image.short_id in running_images and image.digests:
+                for tag in image.tags:
+                    references.setdefault(parse_image_reference(tag), []).append((host, image, tag))
+
+    messages = {}
+    session = requests.Session()
+    with ThreadPoolExecutor(max_workers=update_workers, thread_name_prefix="registry") as executor:
+        futures = {executor.submit(fetch_registry_digest, session, *reference): reference for reference in references}
+        for future in as_completed(futures):
+            reference = futures[future]
+            try:
+                remote_digest = future.result()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.warning(f"Error checking {reference[0]}/{reference[1]}:{reference[2]} for updates: {e}")
+                continue
+            for host, image, tag in references[reference]:
+                local_digests = {digest.split("@", 1)[1] for digest in image.digests if parse_image_reference(digest.split("@", 1)[0])[:2] == reference[:2]}
+                if not remote_digest or not local_digests or remote_digest in local_digests:
+                    host.image_updates.pop(tag, None)
+                elif host.image_updates.get(tag) != remote_digest:
+                    """Each new upstream digest is reported once"""
+                    host.image_updates[tag] = remote_digest
+                    messages.setdefault(host, []).append(
+                        f"{yellow_dot} *{tag}*{'' if compact_format else f' ({image.short_id})'}: update available!"
+                    )
+    session.close()
+    for host in docker_hosts:
+        for tag in [tag for tag in host.image_updates if not any(tag in image.tags for image in host.snapshot.images)]:
+            del host.image_updates[tag]
+        if messages.get(host):
+            notify(host.node_name, "images", "\n".join(sorted(messages[host])))
+    logger.debug(f"Image update check: {len(references)} repository tags, {sum(len(host.image_updates) for host in docker_hosts)} updates available")
+
+
+def image_updates_checker():
+    """Check running images for upstream updates every UPDATE_CHECK_SEC"""
+    while True:
+        try:
+            check_image_updates()
+        except Exception as e:
+            logger.error(f"Error checking images for updates: {e}")
+        time.sleep(update_check_sec)
+
+
+STATS_BUDGET = 0.5
+"""Share of STATS_SEC the stats workers may spend sampling; beyond it each pass samples the next containers in turn"""
+stats_one_shot = None
+
+
+class ContainerStats:
+    """Ring buffer of the latest usage samples of one running container and its active threshold alerts"""
+    __slots__ = ("name", "samples", "usage", "alerts")
+
+    def __init__(self, name: str):
+        self.name, self.samples, self.usage, self.alerts = name, deque(maxlen=stats_window), None, set()
+
+
+def get_usage_percent(stats: dict, previous: tuple) -> tuple:
+    """CPU (100 per core, as in docker stats) and memory percent of a one-shot stats sample, and its CPU counters for the next one"""
+    cpu_stats, memory_stats = stats.get("cpu_stats") or {}, stats.get("memory_stats") or {}
+    usage = (cpu_stats.get("cpu_usage", {}).get("total_usage", 0), cpu_stats.get("system_cpu_usage", 0))
+    precpu_stats = stats.get("precpu_stats") or {}
+    if precpu_stats.get("system_cpu_usage"):
+        previous = (precpu_stats.get("cpu_usage", {}).get("total_usage", 0), precpu_stats["system_cpu_usage"])
+    cpu_percent = None
+    if previous and usage[1] > previous[1]:
+        online_cpus = cpu_stats.get("online_cpus") or len(cpu_stats.get("cpu_usage", {}).get("percpu_usage") or ()) or 1
+        cpu_percent = max(usage[0] - previous[0], 0) / (usage[1] - previous[1]) * online_cpus * 100
+    memory = memory_stats.get("stats") or {}
+    used = memory_stats.get("usage", 0) - memory.get("inactive_file", memory.get("total_inactive_file", 0))
+    memory_percent = max(used, 0) / memory_stats["limit"] * 100 if memory_stats.get("limit") else 0.0
+    return cpu_percent, memory_percent, usage
+
+
+def get_stats_options(docker_client) -> dict:
+    """one_shot skips the daemon's second sample on API 1.41 and later, the docker SDK has it since 6.1"""
+    global stats_one_shot
+    if stats_one_shot is None:
+        import inspect
+        stats_one_shot = "one_shot" in inspect.signature(docker_client.api.stats).parameters
+    return {"one_shot": True} if stats_one_shot and docker.utils.version_gte(docker_client.api._version, "1.41") else {}
+
+
+def fetch_container_stats(host: DockerHost, short_id: str) -> tuple:
+    """One stats sample of a container and its latency"""
+    start = time.perf_counter()
+    stats = docker_request(host, lambda docker_client: docker_client.api.stats(short_id, stream=False, **get_stats_options(docker_client)))
+    duration = time.perf_counter() - start
+    observe_metric("dockcheck_stats_duration_seconds", (("node", host.node_name),), duration)
+    return stats, duration
+
+
+def check_stats_thresholds(short_id: str, entry: ContainerStats) -> list:
+    """Alert when every sample in the window is over a threshold, and again when the window average drops below it"""
+    messages, container_id = [], '' if compact_format else f' ({short_id})'
+    for resource, index, threshold in (("CPU", 1, cpu_alert_percent), ("memory", 2, memory_alert_percent)):
+        if not threshold:
+            continue
+        values = [sample[index] for sample in entry.samples]
+        if resource not in entry.alerts and len(values) == stats_window and min(values) >= threshold:
+            entry.alerts.add(resource)
+            messages.append(f"{orange_dot} *{entry.name}*{container_id}: {resource} {values[-1]:.0f}% for {int(entry.samples[-1][0] - entry.samples[0][0])} seconds!")
+        elif resource in entry.alerts and sum(values) / len(values) < threshold:
+            entry.alerts.discard(resource)
+            messages.append(f"{green_dot} *{entry.name}*{container_id}: {resource} back to {values[-1]:.0f}%!")
+    return messages
+
+
+def sample_container_stats(host: DockerHost, executor: ThreadPoolExecutor) -> list:
+    """Sample as many running containers of a host as the measured cost per sample fits in the budget, continuing where the last pass stopped"""
+    running = [container for container in host.snapshot.containers if container.status == "running"]
+    for short_id in set(host.stats) - {container.short_id for container in running}:
+        del host.stats[short_id]
+    if not running:
+        return []
+    """Until the first samples are measured, take one container per worker"""
+    limit = max(int(stats_sec * STATS_BUDGET * stats_workers / host.stats_cost), stats_workers) if host.stats_cost else stats_workers
+    offset = host.stats_offset % len(running)
+    batch = (running[offset:] + running[:offset])[:limit]
+    host.stats_offset = offset + len(batch)
+
+    messages, durations = [], []
+    futures = {executor.submit(fetch_container_stats, host, container.short_id): container for container in batch}
+    for future in as_completed(futures):
+        container = futures[future]
+        try:
+            stats, duration = future.result()
+        except (docker.errors.DockerException, requests.exceptions.RequestException) as e:
+            logger.debug(f"{host.node_name}: no stats for {container.name}: {e}")
+            continue
+        except Exception as e:
+            """One failing container does not throw away the samples of the rest of the batch"""
+            logger.warning(f"{host.node_name}: error sampling stats of {container.name}: {e}")
+            continue
+        durations.append(duration)
+        entry = host.stats.setdefault(container.short_id, ContainerStats(container.name))
+        entry.name = container.name
+        cpu_percent, memory_percent, entry.usage = get_usage_percent(stats, entry.usage)
+        if cpu_percent is not None:
+            entry.samples.append((time.monotonic(), cpu_percent, memory_percent))
+            messages += check_stats_thresholds(container.short_id, entry)
+    if durations:
+        host.stats_cost = sum(durations) / len(durations)
+        logger.debug(f"{host.node_name}: stats of {len(durations)}/{len(running)} running containers, {host.stats_cost * 1000:.1f} ms per container")
+    return messages
+
+
+def container_stats_sampler():
+    """Sample the stats of the running containers of every host every STATS_SEC on a bounded worker pool"""
+    with ThreadPoolExecutor(max_workers=stats_workers, thread_name_prefix="stats") as executor:
+        while True:
+            started = time.monotonic()
+            for host in docker_hosts:
+                try:
+                    messages = sample_container_stats(host, executor)
+                except Exception as e:
+                    logger.error(f"Error sampling container stats of {host.node_name}: {e}")
+                    continue
+                if messages:
+                    notify(host.node_name, "stats", "\n".join(messages))
+            time.sleep(max(stats_sec - (time.monotonic() - started), 1))
+
+
+def get_percentile(values: list, percent: int) -> float:
+    """Nearest-rank percentile of the values"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) * percent // 100, len(ordered) - 1)]
+
+
+def log_cycle_timing(host: DockerHost, check_types: set, phases: Counter, total: float):
+    """Log the phase timings of a monitoring cycle as a JSON line, with a rolling p50/p95/max summary"""
+    timing = {phase: round(phases[phase] * 1000, 3) for phase in TIMING_PHASES}
+    timing["total"] = round(total * 1000, 3)
+    host.timings.append(timing)
+    host.cycles += 1
+    logger.info(json.dumps({
+        "event": "cycle", "node": host.node_name, "cycle": host.cycles, "checks": sorted(check_types),
+        "ms": timing, "api_calls": dict(host.api_calls)
+    }, separators=(",", ":")))
+    if host.cycles % TIMING_SUMMARY_CYCLES == 0:
+        summary = {}
+        for phase in (*TIMING_PHASES, "total"):
+            values = [timing[phase] for timing in host.timings]
+            summary[phase] = {"p50": get_percentile(values, 50), "p95": get_percentile(values, 95), "max": max(values)}
+        logger.info(json.dumps({"event": "summary", "node": host.node_name, "cycles": len(host.timings), "ms": summary}, separators=(",", ":")))
+
+
+def start_cycle_profile():
+    """Profile the monitoring cycle until PROFILE_CYCLES cycles are recorded, one cycle at a time"""
+    if profiled_cycles >= profile_cycles or not profile_lock.acquire(blocking=False):
+        return None
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop_cycle_profile(profiler):
+    """Add the cycle profile to the collected stats and save them once PROFILE_CYCLES cycles are recorded"""
+    global profile_stats, profiled_cycles
+    profiler.disable()
+    try:
+        import pstats
+        profile_stats = profile_stats.add(profiler) if profile_stats else pstats.Stats(profiler)
+        while fetch_profilers:
+            profile_stats.add(fetch_profilers.popleft())
+        profiled_cycles += 1
+        if profiled_cycles == profile_cycles:
+            os.makedirs(os.path.dirname(profile_file), exist_ok=True)
+            profile_stats.dump_stats(profile_file)
+            logger.info(f"Profile of {profiled_cycles} monitoring cycles saved to {profile_file}, view it with: python -m pstats {profile_file}")
+    except OSError as e:
+        logger.error(f"Error saving profile to {profile_file}: {e}")
+    finally:
+        profile_lock.release()
+
+
+def docker_monitor(host: DockerHost, check_types: set = None):
+    """Periodically check for changes in Docker monitoring resources of one host"""
+    check_types = (check_types or set(CHECK_TYPES)) & enabled_checks
+    if not check_types:
+        return
+    if not host.monitor_lock.acquire(blocking=False):
+        """A cycle of this host is still running, its checks run right after it instead of piling up"""
+        with pending_checks_lock:
+            host.pending_checks.update(check_types)
+        return
+
+    profiler = start_cycle_profile() if profile_cycles else None
+    ran_checks, changed_checks = set(), set()
+    host.api_calls = api_call_context.calls = Counter()
+    try:
+        """Checks run in the order their listings arrive, so a slow images listing does not delay container alerts"""
+        previous_snapshot, phases = host.snapshot, Counter()
+        started = phase_started = time.perf_counter()
+        for ready_checks, snapshot in iter_docker_snapshots(host, check_types, host.snapshot):
+            phases["fetch"] += time.perf_counter() - phase_started
+            for check_type in [check_type for check_type in CHECK_TYPES if check_type in ready_checks]:
+                check_started = time.perf_counter()
+                messages = check_resource(host, check_type, host.snapshot, snapshot)
+                diff_finished = time.perf_counter()
+                ran_checks.add(check_type)
+                if messages:
+                    changed_checks.add(check_type)
+                for message in messages:
+                    notify(host.node_name, check_type, message)
+                check_finished = time.perf_counter()
+                phases["diff"] += diff_finished - check_started
+                phases["send"] += check_finished - diff_finished
+                observe_metric("dockcheck_check_duration_seconds", (("node", host.node_name), ("check", check_type)), check_finished - check_started)
+            host.snapshot = host.snapshot._replace(**{field: getattr(snapshot, field) for check_type in ready_checks for field in CHECK_FIELDS[check_type]})
+            phase_started = time.perf_counter()
+
+        if host.state_file and host.snapshot != previous_snapshot:
+            save_state(host)
+            phases["save"] += time.perf_counter() - phase_started
+        cycle_time = time.perf_counter() - started
+        observe_metric("dockcheck_monitor_duration_seconds", (("node", host.node_name),), cycle_time)
+        if timing_log:
+            log_cycle_timing(host, check_types, phases, cycle_time)
+
+        """Report the Docker API round-trips and connection reuse of this cycle"""
+        api_calls = ", ".join(f"{endpoint}: {count}" for endpoint, count in sorted(host.api_calls.items()))
+        pool_stats = get_docker_pool_stats(host)
+        logger.debug(
+            f"{host.node_name}: Docker API calls: {sum(host.api_calls.values())} ({api_calls}), "
+            f"new connections: {pool_stats['connections']}, reused: {pool_stats['reused']}"
+        )
+    except Exception as e:
+        logger.error(f"Error monitoring {host.node_name or host.base_url}: {e}")
+    finally:
+        api_call_context.calls = None
+        if profiler:
+            stop_cycle_profile(profiler)
+        reschedule_checks(host, check_types, ran_checks, changed_checks)
+        host.monitor_lock.release()
+        if host.pending_checks:
+            pending_checks_event.set()
+
+
+def reschedule_checks(host: DockerHost, check_types: set, ran_checks: set, changed_checks: set):
+    """Schedule the next poll of the checks: back to the base interval after a change, doubling while idle up to IDLE_BACKOFF"""
+    with pending_checks_lock:
+        schedule_checks(host, check_types, ran_checks, changed_checks)
+
+
+def schedule_checks(host: DockerHost, check_types: set, ran_checks: set, changed_checks: set):
+    """reschedule_checks for a caller already holding pending_checks_lock"""
+    now = time.monotonic()
+    changed_sources = {source for check_type in changed_checks for source in CHECK_SOURCES[check_type]}
+    for check_type in (set(check_types) | set(host.check_due)) & enabled_checks:
+        base_interval = check_intervals[check_type]
+        interval = host.check_intervals.get(check_type, base_interval)
+        if CHECK_SOURCES[check_type] & changed_sources:
+            """A change resets its check and the checks reading the same listing, more changes tend to follow"""
+            interval = base_interval
+        elif check_type in ran_checks and check_type in BACKOFF_CHECKS:
+            interval = min(interval * 2, base_interval * idle_backoff)
+        if interval != host.check_intervals.get(check_type, base_interval):
+            logger.debug(f"{host.node_name}: {check_type} polling interval: {interval} seconds")
+        host.check_intervals[check_type] = interval
+        if check_type in check_types:
+            host.check_due[check_type] = now + interval
+        elif host.check_due[check_type] != float("inf"):
+            host.check_due[check_type] = min(host.check_due[check_type], now + interval)
+
+
+def run_due_checks():
+    """Poll the checks whose interval elapsed, a check still running is not polled again until it finishes, and send due health alerts"""
+    now = time.monotonic()
+    for host in docker_hosts:
+        health_messages = host.health.due_alerts() if host.health.watched else []
+        if health_messages:
+            notify(host.node_name, "containers", "\n".join(health_messages))
+        with pending_checks_lock:
+            check_types = {check_type for check_type, due in host.check_due.items() if due <= now}
+            """Checks reading the same listing join when due within half their interval, sharing the fetch"""
+            sources = {source for check_type in check_types for source in CHECK_SOURCES[check_type]}
+            check_types |= {
+                check_type for check_type, due in host.check_due.items()
+                if CHECK_SOURCES[check_type] & sources and due - now <= host.check_intervals[check_type] / 2
+            }
+            for check_type in check_types:
+                host.check_due[check_type] = float("inf")
+            if events_mode:
+                """In events mode a due check is the reconciliation, a full relist"""
+                host.full_sources |= {source for check_type in check_types for source in CHECK_SOURCES[check_type]}
+        if check_types:
+            submit_monitor(host, check_types)
+
+
+def monitor_hosts(docker_hosts: list):
+    """Run a full check of the Docker hosts concurrently"""
+    for host in docker_hosts:
+        submit_monitor(host)
+
+
+def submit_monitor(host: DockerHost, check_types: set = None):
+    """Queue a cycle of the host, checks arriving while one is queued or running join the next cycle instead of queueing more"""
+    with pending_checks_lock:
+        if host.monitor_queued:
+            host.pending_checks.update(check_types or CHECK_TYPES)
+            return
+        host.monitor_queued = True
+    monitor_executor.submit(run_monitor, host, check_types)
+
+
+def run_monitor(host: DockerHost, check_types: set = None):
+    """Run a queued cycle, then wake up the main loop for the checks that arrived meanwhile"""
+    try:
+        docker_monitor(host, check_types)
+    finally:
+        with pending_checks_lock:
+            host.monitor_queued = False
+            pending = bool(host.pending_checks)
+        if pending:
+            pending_checks_event.set()
+
+
+def docker_events_listener(host: DockerHost):
+    """Stream Docker events of the host and queue the affected resource checks for an immediate run"""
+    reconnect = False
+    while True:
+        try:
+            events = docker_request(host, lambda docker_client: docker_client.events(decode=True, filters={"type": list(EVENT_CHECKS)}))
+            if reconnect:
+                """Events may have been missed while disconnected, recheck everything"""
+                queue_checks(host, set(CHECK_TYPES), full_sources=set(EVENT_SOURCES.values()))
+            reconnect = True
+            for event in events:
+                action = event.get("Action", event.get("status", ""))
+                if action.startswith(IGNORED_EVENT_ACTIONS):
+                    continue
+                actor, source = event.get("Actor") or {}, EVENT_SOURCES.get(event.get("Type"))
+                changed_ids = {source: {actor["ID"]}} if source in LISTING_KEYS and actor.get("ID") else {}
+                """Network connects and volume mounts also change the container they name"""
+                container_id = (actor.get("Attributes") or {}).get("container")
+                if container_id and source != "containers":
+                    changed_ids["containers"] = {container_id}
+                full_sources = {source} if source and not changed_ids.get(source) else set()
+                queue_checks(host, EVENT_CHECKS.get(event.get("Type"), set()), changed_ids, full_sources)
+        except (docker.errors.DockerException, Exception) as e:
+            logger.error(f"Error reading Docker events of {host.node_name or host.base_url}: {e}")
+        time.sleep(5)
+
+
+def queue_checks(host: DockerHost, check_types: set, changed_ids: dict = None, full_sources: set = frozenset()):
+    """Mark resource checks of the host as pending, with the resources to relist, and wake up the main loop"""
+    if check_types:
+        with pending_checks_lock:
+            host.pending_checks.update(check_types)
+            for source, keys in (changed_ids or {}).items():
+                host.changed_ids.setdefault(source, set()).update(keys)
+            host.full_sources.update(full_sources)
+        pending_checks_event.set()
+
+
+def run_pending_checks():
+    """Run the resource checks queued by Docker events"""
+    time.sleep(EVENTS_DEBOUNCE)
+    pending_checks_event.clear()
+    for host in docker_hosts:
+        with pending_checks_lock:
+            if host.monitor_queued or not host.pending_checks:
+                """A queued or running cycle picks these up when it finishes"""
+                continue
+            check_types = set(host.pending_checks)
+            host.pending_checks.clear()
+        submit_monitor(host, check_types)
+
+
+def start_docker_host(host: DockerHost, index: int) -> bool:
+    """Connect to the host, then restore its saved state or take the initial snapshot; True when state was restored"""
+    docker_info = get_docker_info(host)
+    host.node_name = host.node_name or docker_info["docker_engine_name"]
+    host.docker_version = docker_info["docker_version"]
+    if state_file:
+        state_root, state_ext = os.path.splitext(state_file)
+        host.state_file = state_file if len(docker_hosts) == 1 else f"{state_root}-{host.node_name or index}{state_ext}"
+    saved_snapshot, stale_checks = load_state(host) if host.state_file else (None, set())
+    host.snapshot = saved_snapshot or take_docker_snapshot(host, enabled_checks)
+    if saved_snapshot and stale_checks:
+        """Like a reload, refiltered or newly enabled checks start from a fresh snapshot instead of reporting the difference"""
+        logger.info(f"{host.node_name}: FILTERS or MONITORING_RESOURCES of {', '.join(sorted(stale_checks))} changed since the state was saved, taking a fresh snapshot of them")
+        snapshot = take_docker_snapshot(host, stale_checks, host.snapshot)
+        host.snapshot = host.snapshot._replace(**{field: getattr(snapshot, field) for check_type in stale_checks for field in CHECK_FIELDS[check_type]})
+    host.health.seed(host.snapshot.containers)
+    if host.state_file and (not saved_snapshot or stale_checks):
+        save_state(host)
+    return bool(saved_snapshot)
+
+
+def parse_config(config_json: dict) -> dict:
+    """Validate config.json into the monitor settings; a wrong value raises, so a bad edit never replaces working settings"""
+    base_dir = os.path.dirname(CONFIG_FILE)
+    sec_repeat = max(int(config_json.get("SEC_REPEAT", 10)), 10)
+    events_mode = config_json.get("EVENTS_MODE", False)
+    sec_reconcile = max(int(config_json.get("SEC_RECONCILE", 3600)), sec_repeat)
+    check_intervals_config = {key.lower(): value for key, value in config_json.get("CHECK_INTERVALS", {}).items()}
+    monitoring_resources = config_json.get("MONITORING_RESOURCES", {})
+    state_file = config_json.get("STATE_FILE", "data/state.json")
+    history_file = config_json.get("HISTORY_FILE", "")
+    dots = DOTS if config_json.get("DEFAULT_DOT_STYLE", True) else SQUARE_DOTS
+    settings = {
+        "startup_message": config_json.get("STARTUP_MESSAGE", True),
+        "compact_format": config_json.get("COMPACT_MESSAGE", False),
+        "default_dot_style": config_json.get("DEFAULT_DOT_STYLE", True),
+        "sec_repeat": sec_repeat,
+        "log_level": str(config_json.get("LOG_LEVEL", "INFO")).upper(),
+        "events_mode": events_mode,
+        "sec_reconcile": sec_reconcile,
+        "check_intervals": {check_type: max(int(check_intervals_config.get(check_type, sec_repeat * factor)), 10) for check_type, factor in CHECK_INTERVAL_FACTORS.items()},
+        "idle_backoff": max(int(config_json.get("IDLE_BACKOFF", 2)), 1),
+        "fetch_workers": max(int(config_json.get("FETCH_WORKERS", 4)), 1),
+        "fetch_timeout": max(int(config_json.get("FETCH_TIMEOUT", 10)), 1),
+        "send_retries": max(int(config_json.get("SEND_RETRIES", 5)), 1),
+        "send_queue_size": max(int(config_json.get("SEND_QUEUE_SIZE", 100)), 1),
+        "coalesce_sec": max(int(config_json.get("COALESCE_SEC", 0)), 0),
+        "unhealthy_alert_sec": max(int(config_json.get("UNHEALTHY_ALERT_SEC", 0)), 0),
+        "flap_changes": max(int(config_json.get("FLAP_CHANGES", 5)), 0),
+        "flap_window_sec": max(int(config_json.get("FLAP_WINDOW_SEC", 300)), 1),
+        "state_file": os.path.join(base_dir, state_file) if state_file else "",
+        "metrics_address": config_json.get("METRICS_ADDRESS", "0.0.0.0"),
+        "metrics_port": max(int(config_json.get("METRICS_PORT", 0)), 0),
+        "timing_log": config_json.get("TIMING_LOG", False),
+        "profile_cycles": max(int(config_json.get("PROFILE_CYCLES", 0)), 0),
+        "profile_file": os.path.join(base_dir, config_json.get("PROFILE_FILE", "data/dockcheck.prof")),
+        "docker_hosts_config": config_json.get("DOCKER_HOSTS", []),
+        "docker_hosts": get_docker_hosts(config_json.get("DOCKER_HOSTS", [])),
+        "resource_filters": compile_resource_filters(config_json.get("FILTERS", {})),
+        "update_check_sec": max(int(config_json.get("UPDATE_CHECK_SEC", 0)), 0),
+        "update_cache_sec": max(int(config_json.get("UPDATE_CACHE_SEC", 21600)), 0),
+        "update_workers": max(int(config_json.get("UPDATE_WORKERS", 4)), 1),
+        "insecure_registries": set(config_json.get("INSECURE_REGISTRIES", [])),
+        "stats_sec": max(int(config_json.get("STATS_SEC", 0)), 0),
+        "stats_workers": max(int(config_json.get("STATS_WORKERS", 4)), 1),
+        "stats_window": max(int(config_json.get("STATS_WINDOW", 5)), 2),
+        "cpu_alert_percent": max(float(config_json.get("CPU_ALERT_PERCENT", 90)), 0),
+        "memory_alert_percent": max(float(config_json.get("MEMORY_ALERT_PERCENT", 90)), 0),
+        "history_file": os.path.join(base_dir, history_file) if history_file else "",
+        "history_max_events": max(int(config_json.get("HISTORY_MAX_EVENTS", 1000000)), 0),
+        "enabled_checks": {check_type for check_type in CHECK_TYPES if monitoring_resources.get(check_type.upper(), True)},
+        **{f"{color}_dot": dot for color, dot in dots.items()}
+    }
+    if events_mode:
+        """Events trigger the checks, polling is only a rare full reconciliation"""
+        settings["check_intervals"], settings["idle_backoff"] = {check_type: sec_reconcile for check_type in CHECK_TYPES}, 1
+    return settings
+
+
+def get_platform_settings(config_json: dict) -> tuple:
+    """Names of the enabled messaging platforms and their settings merged into platform_* lists"""
+    platform_names, platform_settings = [], {}
+    for platform in set(config_json) - NO_MESSAGING_KEYS:
+        if config_json[platform].get("ENABLED", False):
+            for key, value in config_json[platform].items():
+                platform_settings.setdefault(f"platform_{key.lower()}", []).extend(value if isinstance(value, list) else [value])
+            platform_names.append(platform.lower().capitalize())
+    return platform_names, platform_settings
+
+
+def config_changed() -> bool:
+    """True when SIGHUP asked for a reload or config.json was modified since it was last read"""
+    try:
+        return reload_requested.is_set() or os.stat(CONFIG_FILE).st_mtime != config_mtime
+    except OSError:
+        return False
+
+
+def reload_config():
+    """Apply an edited config.json without a restart: only the changed parts are rebuilt and the snapshots are kept"""
+    global config_mtime
+    reload_requested.clear()
+    try:
+        config_mtime = os.stat(CONFIG_FILE).st_mtime
+        with open(CONFIG_FILE, "r") as file:
+            config_json = json.loads(file.read())
+        settings = parse_config(config_json)
+        _, platform_settings = get_platform_settings(config_json)
+        if not all(platform_key in platform_settings for platform_key in PLATFORM_KEYS):
+            raise ValueError("no messaging platform is enabled")
+        """Compiled before any setting is swapped, so a platform that cannot be sent with rejects the whole reload"""
+        senders = compile_platform_senders(platform_settings)
+    except (OSError, json.JSONDecodeError, ValueError, TypeError, KeyError, AttributeError, docker.errors.DockerException) as e:
+        logger.error(f"Error reloading config.json, the current settings are kept: {e}")
+        return
+
+    del settings["docker_hosts"]
+    changed = {name for name, value in settings.items() if globals()[name] != value}
+    if "events_mode" in changed:
+        changed -= {"check_intervals", "idle_backoff"}
+    restart_keys = sorted(RESTART_SETTINGS[name] for name in changed & RESTART_SETTINGS.keys())
+    if restart_keys:
+        logger.warning(f"Changes of {', '.join(restart_keys)} in config.json need a restart")
+    changed -= RESTART_SETTINGS.keys()
+    platforms_changed = any(globals()[platform_key] != platform_settings[platform_key] for platform_key in PLATFORM_KEYS)
+
+    previous_checks = enabled_checks
+    globals().update({name: settings[name] for name in changed})
+    globals().update({platform_key: platform_settings[platform_key] for platform_key in PLATFORM_KEYS})
+    logger.setLevel(getattr(logging, log_level, logging.INFO))
+    if platforms_changed:
+        start_platform_senders(senders)
+    if changed & {"enabled_checks", "resource_filters", "check_intervals", "idle_backoff"}:
+        """Refiltered or newly enabled checks start from a fresh snapshot instead of reporting the difference"""
+        rebase_checks = set(enabled_checks) if "resource_filters" in changed else enabled_checks - previous_checks
+        reset_intervals = bool(changed & {"check_intervals", "idle_backoff"})
+        for host in docker_hosts:
+            monitor_executor.submit(apply_check_settings, host, rebase_checks, reset_intervals)
+    changes = ", ".join(sorted(changed | ({"messaging"} if platforms_changed else set())))
+    logger.info(f"config.json reloaded, {f'changed: {changes}' if changes else 'no changes applied'}")
+
+
+def apply_check_settings(host: DockerHost, rebase_checks: set, reset_intervals: bool):
+    """Bring the snapshot and schedule of one host in line with reloaded checks, filters and intervals"""
+    if rebase_checks:
+        with pending_checks_lock:
+            host.full_sources |= {source for check_type in rebase_checks for source in CHECK_SOURCES[check_type]}
+        with host.monitor_lock:
+            snapshot = take_docker_snapshot(host, rebase_checks, host.snapshot)
+            if "containers" in rebase_checks:
+                host.health.update(host.snapshot.containers, snapshot.containers)
+            host.snapshot = host.snapshot._replace(**{field: getattr(snapshot, field) for check_type in rebase_checks for field in CHECK_FIELDS[check_type]})
+            if host.state_file:
+                save_state(host)
+    with pending_checks_lock:
+        for check_type in set(host.check_due) - enabled_checks:
+            del host.check_due[check_type]
+            host.check_intervals.pop(check_type, None)
+        host.pending_checks &= enabled_checks
+        idle_checks = {check_type for check_type, due in host.check_due.items() if due != float("inf")} if reset_intervals else set()
+        for check_type in idle_checks:
+            host.check_intervals.pop(check_type, None)
+        new_checks = enabled_checks - set(host.check_due)
+        """Rescheduled in the same critical section, run_due_checks never sees a due check without its interval"""
+        schedule_checks(host, idle_checks | new_checks, set(), set())
 
 
 if __name__ == "__main__":
     """Load configuration and initialize monitoring"""
-    platform_base_url = get_platform_base_url()
-    docker_info = get_docker_info()
-    node_name = docker_info["docker_engine_name"]
-    config_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), "config.json")
-    old_list_images = unused_image_name = []
-    old_list_stacks = old_list_containers = []
-    old_list_networks = old_list_unetworks = []
-    old_list_volumes = old_list_uvolumes = []
-    dots = {"orange": "\U0001F7E0", "green": "\U0001F7E2", "red": "\U0001F534", "yellow": "\U0001F7E1"}
-    square_dots = {"orange": "\U0001F7E7", "green": "\U0001F7E9", "red": "\U0001F7E5", "yellow": "\U0001F7E8"}
-    header_message = f"*{node_name}* (.docker)\n"
-    monitoring_message = f"- docker engine: {docker_info['docker_version']},\n"
-    
-    if os.path.exists(config_file):
-        with open(config_file, "r") as file:
+    if os.path.exists(CONFIG_FILE):
+        config_mtime = os.stat(CONFIG_FILE).st_mtime
+        with open(CONFIG_FILE, "r") as file:
             config_json = json.loads(file.read())
         try:
-            startup_message = config_json.get("STARTUP_MESSAGE", True)
-            compact_format = config_json.get("COMPACT_MESSAGE", False)
-            default_dot_style = config_json.get("DEFAULT_DOT_STYLE", True)
-            sec_repeat = max(int(config_json.get("SEC_REPEAT", 10)), 10)
-            monitoring_resources = config_json.get("MONITORING_RESOURCES", {})
-            stacks_enabled = monitoring_resources.get("STACKS", True)
-            containers_enabled = monitoring_resources.get("CONTAINERS", True)
-            networks_enabled = monitoring_resources.get("NETWORKS", True)
-            volumes_enabled = monitoring_resources.get("VOLUMES", True)
-            images_enabled = monitoring_resources.get("IMAGES", True)
-        except (json.JSONDecodeError, ValueError, TypeError, KeyError):
-            startup_message, compact_format, default_dot_style = True, False, True
-            sec_repeat = 10
-            stacks_enabled = containers_enabled = networks_enabled = volumes_enabled = images_enabled = True
+            globals().update(parse_config(config_json))
+        except (json.JSONDecodeError, ValueError, TypeError, KeyError, AttributeError, docker.errors.DockerException):
+            globals().update(parse_config({}))
             logger.error("Error or incorrect settings in config.json. Default settings will be used.")
         
-        if not default_dot_style:
-            dots = square_dots
-        orange_dot, green_dot, red_dot, yellow_dot = dots["orange"], dots["green"], dots["red"], dots["yellow"]
-        no_messaging_keys = ["MONITORING_RESOURCES", "STARTUP_MESSAGE", "COMPACT_MESSAGE", "DEFAULT_DOT_STYLE", "SEC_REPEAT"]
-        messaging_platforms = list(set(config_json) - set(no_messaging_keys))
-        
-        for platform in messaging_platforms:
-            if config_json[platform].get("ENABLED", False):
-                for key, value in config_json[platform].items():
-                    platform_key = f"platform_{key.lower()}"
-                    if platform_key in globals():
-                        globals()[platform_key] = (globals()[platform_key] if isinstance(globals()[platform_key], list) else [globals()[platform_key]])
-                        globals()[platform_key].extend(value if isinstance(value, list) else [value])
-                    else:
-                        globals()[platform_key] = value if isinstance(value, list) else [value]
-                monitoring_message += f"- messaging: {platform.lower().capitalize()},\n"
+        logger.setLevel(getattr(logging, log_level, logging.INFO))
+        platform_names, platform_settings = get_platform_settings(config_json)
+        globals().update(platform_settings)
+        monitoring_message = "".join(f"- messaging: {platform_name},\n" for platform_name in platform_names)
         
+        fetch_executor = ThreadPoolExecutor(max_workers=min(fetch_workers * len(docker_hosts), MAX_FETCH_WORKERS), thread_name_prefix="fetch")
+        monitor_executor = ThreadPoolExecutor(max_workers=min(len(docker_hosts), MONITOR_WORKERS), thread_name_prefix="monitor")
+        """A saved state skips the cold scan, and the first cycle reports what changed while stopped"""
+        restored_hosts = [host for host, restored in zip(docker_hosts, monitor_executor.map(start_docker_host, docker_hosts, range(len(docker_hosts)))) if restored]
+
+        if len(docker_hosts) == 1:
+            header_message = f"*{docker_hosts[0].node_name}* (.docker)\n"
+            monitoring_message += f"- docker engine: {docker_hosts[0].docker_version},\n"
+        else:
+            header_message = f"*{socket.gethostname()}* (.docker)\n"
+            monitoring_message += "".join(f"- docker engine: {host.docker_version} ({host.node_name}),\n" for host in docker_hosts)
         monitoring_message = "\n".join([*sorted(monitoring_message.splitlines()), ""])
-        data_sources = {
-            "stacks": stacks_enabled,
-            "containers": containers_enabled,
-            "images": images_enabled,
-            "networks": networks_enabled,
-            "volumes": volumes_enabled,
-            "uvolumes": volumes_enabled,
-            "unetworks": networks_enabled
-        }
-        
-        for resource, condition in data_sources.items():
-            if condition:
-                globals()[f"old_list_{resource}"] = get_docker_data(resource)
-        
-        docker_counts = get_docker_resources_counts(stacks_enabled, containers_enabled, images_enabled, networks_enabled, volumes_enabled)
-        monitoring_message += "".join(f"- monitoring: {count} {resource},\n" for resource, count in docker_counts.items() if count != 0)
+        docker_counts = sum((Counter(host.snapshot.get_counts()) for host in docker_hosts), Counter())
+        monitoring_message += "".join(f"- monitoring: {docker_counts[resource]} {resource},\n" for resource in ("stacks", "containers", "networks", "volumes", "images") if resource in enabled_checks and docker_counts[resource] != 0)
         monitoring_message += (
             f"- startup message: {'Yes' if startup_message else 'No'},\n"
             f"- compact message: {'Yes' if compact_format else 'No'},\n"
             f"- dot style: {'Round' if default_dot_style else 'Square'},\n"
-            f"- polling period: {sec_repeat} seconds."
+            f"- saved state: {'Loaded' if restored_hosts else 'No'},\n"
+            f"- events mode: {'Yes' if events_mode else 'No'},\n"
+            f"- coalescing window: {f'{coalesce_sec} seconds' if coalesce_sec else 'No'},\n"
+            f"- unhealthy alert: {f'after {unhealthy_alert_sec} seconds' if unhealthy_alert_sec else 'Immediately'},\n"
+            f"- flap detection: {f'{flap_changes} changes in {flap_window_sec} seconds' if flap_changes else 'No'},\n"
+            f"- image update check: {f'every {update_check_sec} seconds' if update_check_sec else 'No'},\n"
+            f"- stats sampling: {f'every {stats_sec} seconds, alerts over {stats_window} samples' if stats_sec else 'No'},\n"
+            f"- event history: {'Yes' if history_file else 'No'},\n"
+            f"- metrics endpoint: {f'{metrics_address}:{metrics_port}' if metrics_port else 'No'},\n"
         )
+        startup_seconds, peak_memory = get_process_uptime(), get_peak_memory()
+        monitoring_message += f"- startup: {startup_seconds:.2f} seconds{f', {peak_memory:.1f} MB peak memory' if peak_memory else ''},\n"
+        if events_mode:
+            monitoring_message += f"- reconcile period: {sec_reconcile} seconds."
+        else:
+            polling_periods = ", ".join(f"{check_type} {check_intervals[check_type]}" for check_type in CHECK_INTERVAL_FACTORS if check_type in enabled_checks)
+            monitoring_message += f"- polling period: {polling_periods} seconds,\n- idle backoff: {f'up to x{idle_backoff} for networks, volumes and images' if idle_backoff > 1 else 'No'}."
         
-        if all(value in globals() for value in ["platform_webhook_url", "platform_header", "platform_payload", "platform_format_message"]):
-            logger.info(f"Started!")
+        if all(platform_key in globals() for platform_key in PLATFORM_KEYS):
+            logger.info(f"Started in {startup_seconds:.2f} seconds{f', peak memory {peak_memory:.1f} MB' if peak_memory else ''}!")
+            start_platform_senders()
+            if history_file and not start_history_writer():
+                history_file = ""
+            if metrics_port:
+                start_metrics_server(metrics_address, metrics_port)
             if startup_message:
                 send_message(f"{header_message}{monitoring_message}")
         else:
@@ -290,257 +2117,29 @@ if __name__ == "__main__":
         logger.error("config.json not found")
         sys.exit(1)
 
-
-"""Periodically check for changes in Docker monitoring resources"""
-@repeat(every(sec_repeat).seconds)
-def docker_monitor():
-    """Check for changes in Docker images"""
-    if images_enabled:
-        global old_list_images, unused_image_name
-        status_message = "pulled"
-        status_dot = yellow_dot
-        message = ""
-        header_message = f"*{node_name}* (.images)\n"
-
-        list_images = get_docker_data("images") or []
-
-        if list_images:
-            old_list_images = old_list_images or list_images
-
-            result = list(set(list_images) - set(old_list_images))
-
-            if not result:
-                result = list(set(old_list_images) - set(list_images))
-                status_message = "removed"
-                status_dot = red_dot
-
-            if result:
-                old_images_str = ",".join(old_list_images)
-
-                for image in result:
-                    image_id, image_name = image.split()
-
-                    if image_id == image_name:
-                        if image_id in old_images_str and status_dot != red_dot:
-                            status_message = "unused"
-                            status_dot = orange_dot
-
-                        if any(image_id in unsed_image for unsed_image in unused_image_name) and not compact_format:
-                            for unsed_image in unused_image_name:
-                                if image_id in unsed_image:
-                                    image_unsed_name, image_unsed_id = unsed_image.split()
-                                    message += (
-                                        f"{status_dot} *{image_unsed_name}* "
-                                        f"({image_unsed_id}): {status_message}!\n"
-                                    )
-                                    unused_image_name.remove(unsed_image)
-                        else:
-                            message += f"{status_dot} *{image_name}*: {status_message}!\n"
-
-                        if status_dot == orange_dot:
-                            status_dot = yellow_dot
-
-                    else:
-                        message += (
-                            f"{status_dot} *{image_name}*"
-                            f"{'' if compact_format else f' ({image_id})'}: {status_message}!\n"
-                        )
-
-                    if status_dot == yellow_dot:
-                        status_message = "pulled"
-
-                old_list_images = list_images
-                message = "\n".join(sorted(message.splitlines()))
-                    
-                if all(keyword in message for keyword in [orange_dot, yellow_dot, "unused!", "pulled!"]) and not compact_format:
-                    new_message = []
-                    message_lines = message.split('\n')
-                    half_length = len(message_lines) // 2
-                
-                    for i in range(half_length):
-                        left = message_lines[i]
-                        right = message_lines[i + half_length]
-                        merged = f"{left} {right}"
-                        
-                        parts = merged.split()
-                        if len(parts) < 5:
-                            continue
-                
-                        unused_id = parts[1].rstrip(':').strip('*')
-                        name_image = parts[4].strip('*')
-                        replace_name = f"*{name_image}* ({unused_id}):"
-                        
-                        unused_image_name.append(f"{name_image} {unused_id}")
-                        parts[1] = replace_name
-                        new_message.append(" ".join(parts))
-                
-                    message = " ".join(new_message).replace("! ", "!\n")
-
-                if message:
-                    send_message(f"{header_message}{message}")
-
-    """Check for changes in Docker networks and volumes"""
-    if networks_enabled or volumes_enabled:
-        check_types = ["networks" if networks_enabled else None, "volumes" if volumes_enabled else None]
-        check_types = [check for check in check_types if check]
-
-        global old_list_networks, old_list_volumes
-
-        for check_type in check_types:
-            status_message = "created"
-            status_dot = yellow_dot
-            message, header_message = "", f"*{node_name}* (.{check_type})\n"
-
-            old_list = old_list_volumes if check_type == "volumes" else old_list_networks
-            new_list = get_docker_data(check_type) or []
-
-            if new_list:
-
-                old_list = old_list or new_list
-
-                result = list(set(new_list) - set(old_list))
-
-                if not result:
-                    result = list(set(old_list) - set(new_list))
-                    status_dot, status_message = red_dot, "removed"
-
-                if check_type == "volumes":
-                    old_list_volumes = new_list
-                else:
-                    old_list_networks = new_list
-
-                if result:
-                    for item in result:
-                        item_name = item.split()[0]
-                        item_detail = f" ({item.split()[-1]})" if check_type != "volumes" and not compact_format else ""
-                        message += f"{status_dot} *{item_name}*{item_detail}: {status_message}!\n"
-
-                    if message:
-                        send_message(f"{header_message}{chr(10).join(sorted(message.splitlines()))}")
-
-        """Check for changes in Docker unused networks and volumes"""
-        global old_list_uvolumes, old_list_unetworks
-
-        for check_type in check_types:
-            status_message = "unused"
-            status_dot = orange_dot
-            message, header_message = "", f"*{node_name}* (.{check_type})\n"
-
-            old_list = old_list_uvolumes if check_type == "volumes" else old_list_unetworks
-            new_list = get_docker_data(f"u{check_type}") or []
-
-            if new_list:
-                result = list(set(new_list) - set(old_list))
-
-                if check_type == "volumes":
-                    old_list_uvolumes = new_list
-                else:
-                    old_list_unetworks = new_list
-
-                if result:
-                    for item in result:
-                        item_name = item.split()[0]
-                        item_detail = f" ({item.split()[-1]})" if check_type != "volumes" and not compact_format else ""
-                        message += f"{status_dot} *{item_name}*{item_detail}: {status_message}!\n"
-
-                    if message:
-                        send_message(f"{header_message}{chr(10).join(sorted(message.splitlines()))}")
-
-    """Check for changes in Docker stacks"""
-    if stacks_enabled:
-        global old_list_stacks
-        message = ""
-        header_message = f"*{node_name}* (.stacks)\n"
-        status_created, status_removed, status_changed = yellow_dot, red_dot, orange_dot
-        status_created_msg, status_removed_msg, status_changed_msg = "created", "removed", "changed"
-
-        list_stacks = get_docker_data("stacks") or []
-        current_stacks = {s.split()[0]: s.split()[1] for s in list_stacks}
-        old_stacks = {s.split()[0]: s.split()[1] for s in old_list_stacks or []}
-
-        created = set(current_stacks) - set(old_stacks)
-        removed = set(old_stacks) - set(current_stacks)
-        common = set(current_stacks) & set(old_stacks)
-
-        for name in sorted(created):
-            stack_hash = current_stacks[name]
-            message += f"{status_created} *{name}*{'' if compact_format else f' ({stack_hash[:12]})'}: {status_created_msg}!\n"
-
-        for name in sorted(removed):
-            stack_hash = old_stacks[name]
-            message += f"{status_removed} *{name}*{'' if compact_format else f' ({stack_hash[:12]})'}: {status_removed_msg}!\n"
-
-        for name in sorted(common):
-            if current_stacks[name] != old_stacks[name]:
-                stack_hash = current_stacks[name]
-                message += f"{status_changed} *{name}*{'' if compact_format else f' ({stack_hash[:12]})'}: {status_changed_msg}!\n"
-
-        if message:
-            send_message(f"{header_message}{message.strip()}")
-    
-        old_list_stacks = list_stacks
-
-    """Check for changes in Docker containers"""
-    if containers_enabled:
-        global old_list_containers
-        status_dot = orange_dot
-        message = ""
-        header_message = f"*{node_name}* (.containers)\n"
-        list_containers = get_docker_data("containers") or []
-        inactive = False
-
-        if list_containers:
-
-            old_list_containers = old_list_containers or list_containers
-
-            result = list(set(list_containers) - set(old_list_containers))
-
-            if not result:
-                result = list(set(old_list_containers) - set(list_containers))
-                if result:
-                    inactive = True
-            
-            if result:
-                old_list_containers = list_containers
-
-                for container in result:
-                    container_info = "".join(container).split()
-                    if len(container_info) != 4:
-                        continue
-
-                    container_name, container_status, container_attr, container_id = container_info
-
-                    if "_" in container_name:
-                        prefix, suffix = container_name.split("_", 1)
-                        if is_hex(prefix):
-                            continue
-
-                    if container_attr == "starting":
-                        continue
-
-                    if inactive:
-                        container_status = "inactive"
-                        status_dot = red_dot
-
-                    elif container_status == "running":
-                        status_dot = orange_dot if container_attr == "unhealthy" else green_dot
-                        if container_attr != container_status:
-                            container_status = container_attr
-                    elif container_status == "created":
-                        status_dot = yellow_dot
-
-                    message += (
-                        f"{status_dot} *{container_name}*"
-                        f"{'' if compact_format else f' ({container_id})'}: {container_status}!\n"
-                    )
-
-                    status_dot = orange_dot
-
-                if message:
-                    send_message(f"{header_message}{chr(10).join(sorted(message.splitlines()))}")
-
-while True:
-    run_pending()
-    time.sleep(1)
-
-
+    for host in docker_hosts:
+        get_docker_pool_stats(host)
+    for host in docker_hosts:
+        reschedule_checks(host, enabled_checks, set(), set())
+    if update_check_sec and "images" in enabled_checks:
+        threading.Thread(target=image_updates_checker, daemon=True).start()
+    if stats_sec and "containers" in enabled_checks:
+        threading.Thread(target=container_stats_sampler, daemon=True).start()
+    if events_mode:
+        for host in docker_hosts:
+            threading.Thread(target=docker_events_listener, args=(host,), daemon=True).start()
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda signum, frame: reload_requested.set())
+    monitor_hosts(restored_hosts)
+
+    while True:
+        try:
+            run_due_checks()
+            if pending_checks_event.wait(1):
+                run_pending_checks()
+            if config_changed():
+                reload_config()
+        except Exception as e:
+            """One failed pass or reload must not stop the monitoring"""
+            logger.error(f"Error in the main loop: {e}")
+            time.sleep(1)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#Copyright (c) 2024-25 2boom.
+
+"""Image update check against the stand-in registry of tools/fake_registry.py, run with: python -m pytest tests"""
+
+import os
+import sys
+import threading
+from types import SimpleNamespace
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+import dockcheck
+from fake_registry import FakeRegistry, make_handler
+
+IMAGE_ID = "0123456789"
+
+
+@pytest.fixture
+def registry():
+    """Stand-in registry on a free port, served from a thread of the test process"""
+    fake_registry = FakeRegistry()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), None)
+    server.RequestHandlerClass = make_handler(fake_registry, server.server_port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    fake_registry.address = f"127.0.0.1:{server.server_port}"
+    yield fake_registry
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def notifications():
+    return []
+
+
+@pytest.fixture
+def host(registry, notifications, monkeypatch):
+    """Docker host running one container of an image pulled from the stand-in registry, with notifications captured"""
+    docker_host = dockcheck.DockerHost("unix://fake.sock", "node")
+    docker_host.client = SimpleNamespace(api=SimpleNamespace(containers=lambda filters=None: [{"ImageID": f"sha256:{IMAGE_ID}fedcba"}]))
+    reference = f"{registry.address}/app"
+    docker_host.snapshot = docker_host.snapshot._replace(images=(
+        dockcheck.ImageRecord(IMAGE_ID, "app", (f"{reference}:latest",), (f"{reference}@{registry.digest('app', 'latest')}",)),
+    ))
+    settings = {
+        "docker_hosts": [docker_host], "update_cache_sec": 60, "update_workers": 2, "insecure_registries": {registry.address},
+        "compact_format": False, "yellow_dot": "y", "registry_cache": {}, "registry_tokens": {},
+        "notify": lambda node_name, check_type, message: notifications.append((node_name, check_type, message))
+    }
+    for name, value in settings.items():
+        monkeypatch.setattr(dockcheck, name, value, raising=False)
+    return docker_host
+
+
+def test_fetch_registry_digest(registry, host, monkeypatch):
+    session = requests.Session()
+    fetch = lambda: dockcheck.fetch_registry_digest(session, registry.address, "app", "latest")
+
+    """A 401 challenge is answered with an anonymous token, then the manifest HEAD returns the digest"""
+    assert fetch() == registry.digest("app", "latest")
+    assert registry.requests == {"unauthorized": 1, "token": 1, "manifest": 1}
+
+    """Within UPDATE_CACHE_SEC the cached digest is reused without a request"""
+    assert fetch() == registry.digest("app", "latest")
+    assert registry.requests == {"unauthorized": 1, "token": 1, "manifest": 1}
+
+    """After it, the digest is revalidated with its ETag and the cached token"""
+    monkeypatch.setattr(dockcheck, "update_cache_sec", 0)
+    assert fetch() == registry.digest("app", "latest")
+    assert registry.requests == {"unauthorized": 1, "token": 1, "manifest": 1, "not_modified": 1}
+
+    """A new digest is fetched in full"""
+    new_digest = registry.bump("app", "latest")
+    assert fetch() == new_digest
+    assert registry.requests == {"unauthorized": 1, "token": 1, "manifest": 2, "not_modified": 1}
+    session.close()
+
+
+def test_check_image_updates(registry, host, notifications, monkeypatch):
+    """The digest of the running image is current, nothing to report"""
+    dockcheck.check_image_updates()
+    assert notifications == []
+
+    """A new upstream digest is reported once, on its own"""
+    monkeypatch.setattr(dockcheck, "update_cache_sec", 0)
+    registry.bump("app", "latest")
+    dockcheck.check_image_updates()
+    dockcheck.check_image_updates()
+    assert notifications == [("node", "images", f"y *{registry.address}/app:latest* ({IMAGE_ID}): update available!")]
+    assert host.image_updates == {f"{registry.address}/app:latest": registry.digest("app", "latest")}
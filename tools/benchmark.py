@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#Copyright (c) 2024-25 2boom.
+
+"""Benchmark dockcheck against a synthetic Docker Engine API and webhook sink.
+
+The stand-in Docker daemon and webhook sink run in a child process, dockcheck runs in this one,
+so the reported memory is dockcheck's own. Example:
+
+    python tools/benchmark.py --containers 1000 --images 5000 --networks 500 --volumes 500 --churn 0.01 --cycles 30
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import multiprocessing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+
+def make_id(value: str) -> str:
+    """Stable 64-character hex ID of a synthetic resource"""
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+class SyntheticDocker:
+    """Synthetic Docker resources with a configurable size and churn rate"""
+    def __init__(self, containers: int, images: int, networks: int, volumes: int, stacks: int, seed: int):
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.serial = 0
+        self.images = {}
+        self.networks = {}
+        self.volumes = {}
+        self.containers = {}
+        self.listings = {}
+        for name in ("bridge", "host", "none"):
+            self.add_network(name)
+        for index in range(networks):
+            self.add_network(f"net{index}")
+        for index in range(volumes):
+            self.add_volume(f"vol{index}")
+        for index in range(images):
+            self.add_image(dangling=index % 20 == 19)
+        network_names = [name for name in self.networks.values() if name["Name"] not in ("bridge", "host", "none")]
+        image_ids = list(self.images)
+        for index in range(containers):
+            stack = f"stack{index % stacks}" if stacks and index % 5 else ""
+            network = network_names[index % len(network_names)]["Name"] if network_names and index % 3 else "bridge"
+            volume = f"vol{index % volumes}" if volumes and index % 2 else ""
+            self.add_container(f"c{index}", image_ids[index % len(image_ids)] if image_ids else "", stack, network, volume)
+
+    def add_network(self, name: str):
+        network_id = make_id(f"network-{name}")
+        self.networks[network_id] = {"Id": network_id, "Name": name, "Driver": "bridge", "Labels": {}}
+
+    def add_volume(self, name: str):
+        self.volumes[name] = {"Name": name, "Driver": "local", "Mountpoint": f"/var/lib/docker/volumes/{name}/_data", "Labels": {}}
+
+    def add_image(self, dangling: bool = False):
+        self.serial += 1
+        image_id = f"sha256:{make_id(f'image-{self.serial}')}"
+        repo_tags = [] if dangling else [f"registry.local/team/app{self.serial}:1.{self.serial % 7}"]
+        self.images[image_id] = {"Id": image_id, "RepoTags": repo_tags, "RepoDigests": [], "Created": 0, "Size": 1, "Labels": {}}
+
+    def add_container(self, name: str, image_id: str, stack: str, network: str, volume: str):
+        container_id = make_id(f"container-{name}")
+        labels = {"com.docker.compose.project": stack, "com.docker.compose.config-hash": make_id(stack)} if stack else {}
+        health = " (healthy)" if self.random.random() < 0.2 else ""
+        self.containers[container_id] = {
+            "Id": container_id, "Names": [f"/{name}"], "Image": image_id, "ImageID": image_id, "Labels": labels,
+            "State": "running", "Status": f"Up 2 hours{health}", "NetworkSettings": {"Networks": {network: {}}},
+            "Mounts": [{"Type": "volume", "Name": volume}] if volume else []
+        }
+
+    def churn(self, rate: float):
+        """Change a share of every resource type: container states, stack configs, pulled and removed images, networks and volumes"""
+        with self.lock:
+            pick = lambda items: self.random.sample(list(items), min(max(int(len(items) * rate), 1), len(items))) if items and rate else []
+            for container in (self.containers[container_id] for container_id in pick(self.containers)):
+                if container["State"] == "running":
+                    container["State"], container["Status"] = "exited", "Exited (0) 1 second ago"
+                else:
+                    container["State"], container["Status"] = "running", "Up 1 second (health: starting)"
+            for container in (self.containers[container_id] for container_id in pick(self.containers)):
+                if container["Labels"]:
+                    container["Labels"]["com.docker.compose.config-hash"] = make_id(f"{container['Id']}-{self.random.random()}")
+            for image_id in pick(self.images):
+                del self.images[image_id]
+                self.add_image()
+            for network_id in pick(self.networks):
+                if self.networks[network_id]["Name"] not in ("bridge", "host", "none"):
+                    del self.networks[network_id]
+                    self.serial += 1
+                    self.add_network(f"net-new{self.serial}")
+            for volume in pick(self.volumes):
+                del self.volumes[volume]
+                self.serial += 1
+                self.add_volume(f"vol-new{self.serial}")
+            self.listings.clear()
+
+    def listing(self, path: str) -> bytes:
+        """Serialized listing of an endpoint, cached until the next churn"""
+        with self.lock:
+            if path not in self.listings:
+                if path == "/containers/json":
+                    body = list(self.containers.values())
+                elif path == "/images/json":
+                    body = list(self.images.values())
+                elif path == "/networks":
+                    body = list(self.networks.values())
+                else:
+                    body = {"Volumes": list(self.volumes.values()), "Warnings": None}
+                self.listings[path] = json.dumps(body).encode()
+            return self.listings[path]
+
+
+def serve_fake_docker(port: int, sink_port: int, options: dict):
+    """Child process: serve the stand-in Docker Engine API and the webhook sink until terminated"""
+    docker_state = SyntheticDocker(**options)
+    api_calls, received = Counter(), Counter()
+    stats_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_body(self, body: bytes, code: int = 200):
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path.startswith("/v1."):
+                path = "/" + path.split("/", 2)[2]
+            if path == "/_bench/stats":
+                with stats_lock:
+                    body = json.dumps({"api_calls": sum(api_calls.values()), "received": sum(received.values())}).encode()
+                    api_calls.clear()
+                return self.send_body(body)
+            with stats_lock:
+                api_calls[path] += 1
+            if path == "/version":
+                return self.send_body(json.dumps({"Version": "27.0.0-bench", "ApiVersion": "1.45"}).encode())
+            if path == "/info":
+                return self.send_body(json.dumps({"Name": "bench"}).encode())
+            if path in ("/containers/json", "/images/json", "/networks", "/volumes"):
+                return self.send_body(docker_state.listing(path))
+            self.send_body(json.dumps({"message": f"page not found: {path}"}).encode(), 404)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path.startswith("/_bench/churn"):
+                docker_state.churn(json.loads(body or b"{}").get("rate", 0))
+            else:
+                with stats_lock:
+                    received[self.path] += 1
+            self.send_body(b"{}")
+
+    for server_port in (port, sink_port):
+        server = ThreadingHTTPServer(("127.0.0.1", server_port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    threading.Event().wait()
+
+
+def get_rss() -> int:
+    """Resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def bench_request(session, method: str, url: str, **kwargs) -> dict:
+    """JSON response of a request to the stand-ins"""
+    response = session.request(method, url, timeout=30, **kwargs)
+    response.raise_for_status()
+    return response.json()
+
+
+def wait_for_port(session, url: str, timeout: float = 10):
+    """Wait until the child process accepts connections"""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return bench_request(session, "GET", url)
+        except Exception:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def run_benchmark(args) -> dict:
+    """Drive docker_monitor() and send_message() against the stand-ins and collect the measurements"""
+    import requests
+    import dockcheck
+    from concurrent.futures import ThreadPoolExecutor
+
+    options = {
+        "containers": args.containers, "images": args.images, "networks": args.networks,
+        "volumes": args.volumes, "stacks": args.stacks, "seed": args.seed
+    }
+    server = multiprocessing.Process(target=serve_fake_docker, args=(args.port, args.sink_port, options), daemon=True)
+    server.start()
+    session = requests.Session()
+    docker_url, sink_url = f"http://127.0.0.1:{args.port}", f"http://127.0.0.1:{args.sink_port}"
+    try:
+        wait_for_port(session, f"{docker_url}/_bench/stats")
+        dockcheck.logger.setLevel("DEBUG" if args.verbose else "WARNING")
+        """The settings of a config.json, so every setting the monitor reads has its usual default"""
+        config_json = {
+            "DOCKER_HOSTS": [{"BASE_URL": f"tcp://127.0.0.1:{args.port}", "NAME": "bench"}],
+            "STATE_FILE": "", "COALESCE_SEC": args.coalesce, "FETCH_WORKERS": args.fetch_workers, "FETCH_TIMEOUT": 60,
+            "SEND_RETRIES": 1, "SEND_QUEUE_SIZE": args.messages + 10000, "IDLE_BACKOFF": 1,
+            "CHECK_INTERVALS": {check_type: 10 for check_type in dockcheck.CHECK_TYPES},
+            "SINK": {
+                "ENABLED": True, "WEBHOOK_URL": [f"{sink_url}/hook"], "HEADER": [{"Content-Type": "application/json"}],
+                "PAYLOAD": [{"text": "message"}], "FORMAT_MESSAGE": ["text"]
+            }
+        }
+        vars(dockcheck).update(dockcheck.parse_config(config_json), **dockcheck.get_platform_settings(config_json)[1])
+        vars(dockcheck).update(fetch_executor=ThreadPoolExecutor(max_workers=args.fetch_workers, thread_name_prefix="fetch"))
+        host = dockcheck.docker_hosts[0]
+        dockcheck.start_platform_senders()
+
+        started = time.perf_counter()
+        host.snapshot = dockcheck.take_docker_snapshot(host, dockcheck.enabled_checks)
+        initial_snapshot = time.perf_counter() - started
+        bench_request(session, "GET", f"{docker_url}/_bench/stats")
+
+        cycle_times, api_calls, rss = [], [], [get_rss()]
+        for _ in range(args.cycles):
+            bench_request(session, "POST", f"{docker_url}/_bench/churn", json={"rate": args.churn})
+            started = time.perf_counter()
+            dockcheck.docker_monitor(host)
+            cycle_times.append(time.perf_counter() - started)
+            api_calls.append(bench_request(session, "GET", f"{docker_url}/_bench/stats")["api_calls"])
+            rss.append(get_rss())
+
+        """Let the change notifications of the cycles drain before measuring the sender throughput"""
+        while any(not platform_queue.empty() for _, platform_queue in dockcheck.platform_channels):
+            time.sleep(0.05)
+        time.sleep(0.2)
+        cycle_messages = bench_request(session, "GET", f"{sink_url}/_bench/stats")["received"]
+        started = time.perf_counter()
+        for index in range(args.messages):
+            dockcheck.send_message(f"*bench* (.containers)\ng *c{index}* ({index:012x}): running!")
+        enqueue_time = time.perf_counter() - started
+        received = 0
+        while received < args.messages and time.perf_counter() - started < args.send_timeout:
+            time.sleep(0.05)
+            received = bench_request(session, "GET", f"{sink_url}/_bench/stats")["received"] - cycle_messages
+        send_time = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.join()
+
+    return {
+        "resources": options,
+        "churn": args.churn,
+        "initial_snapshot_ms": round(initial_snapshot * 1000, 3),
+        "cycle_ms": {
+            "p50": round(dockcheck.get_percentile(cycle_times, 50) * 1000, 3),
+            "p95": round(dockcheck.get_percentile(cycle_times, 95) * 1000, 3),
+            "max": round(max(cycle_times) * 1000, 3)
+        },
+        "api_calls_per_cycle": round(sum(api_calls) / len(api_calls), 2),
+        "cycle_notifications": cycle_messages,
+        "rss_mib": {
+            "start": round(rss[0] / 2 ** 20, 2),
+            "end": round(rss[-1] / 2 ** 20, 2),
+            "growth": round((rss[-1] - rss[0]) / 2 ** 20, 2)
+        },
+        "send": {
+            "messages": args.messages,
+            "delivered": received,
+            "enqueue_us": round(enqueue_time / max(args.messages, 1) * 1e6, 3),
+            "per_second": round(received / send_time, 1) if send_time else 0
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dockcheck against a synthetic Docker Engine API and webhook sink.")
+    parser.add_argument("--containers", type=int, default=1000)
+    parser.add_argument("--images", type=int, default=5000)
+    parser.add_argument("--networks", type=int, default=500)
+    parser.add_argument("--volumes", type=int, default=500)
+    parser.add_argument("--stacks", type=int, default=50)
+    parser.add_argument("--churn", type=float, default=0.01, help="share of each resource type changed before every cycle")
+    parser.add_argument("--cycles", type=int, default=30)
+    parser.add_argument("--messages", type=int, default=1000, help="messages sent through send_message() for the throughput test")
+    parser.add_argument("--coalesce", type=int, default=0, help="COALESCE_SEC used during the cycles")
+    parser.add_argument("--fetch-workers", type=int, default=4)
+    parser.add_argument("--send-timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=23750)
+    parser.add_argument("--sink-port", type=int, default=23780)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep dockcheck logging")
+    args = parser.parse_args()
+
+    result = run_benchmark(args)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    resources = result["resources"]
+    print(
+        f"resources: {resources['containers']} containers, {resources['images']} images, {resources['networks']} networks, "
+        f"{resources['volumes']} volumes, {resources['stacks']} stacks, churn {result['churn']:.1%} per cycle\n"
+        f"initial snapshot: {result['initial_snapshot_ms']} ms\n"
+        f"cycle latency: p50 {result['cycle_ms']['p50']} ms, p95 {result['cycle_ms']['p95']} ms, max {result['cycle_ms']['max']} ms\n"
+        f"api calls per cycle: {result['api_calls_per_cycle']}, notifications: {result['cycle_notifications']}\n"
+        f"rss: {result['rss_mib']['start']} -> {result['rss_mib']['end']} MiB (growth {result['rss_mib']['growth']} MiB)\n"
+        f"send_message: {result['send']['enqueue_us']} us per enqueue, "
+        f"{result['send']['delivered']}/{result['send']['messages']} delivered, {result['send']['per_second']} messages/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#Copyright (c) 2024-25 2boom.
+
+"""Stand-in container registry for the image update check, used by tests/test_registry.py.
+
+Serves manifest HEAD requests behind an anonymous Bearer token flow, with ETags and 304 responses.
+It has no blobs, so images cannot be pulled from it and a locally tagged image has no repository digest
+to compare; the test gives the check images with matching RepoDigests instead. Example:
+
+    python tools/fake_registry.py --port 5000
+    curl -X POST http://127.0.0.1:5000/_registry/bump/app/latest    # publish a new digest
+    curl http://127.0.0.1:5000/_registry/stats                      # requests served so far
+"""
+
+import json
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+TOKEN = "dockcheck-anonymous"
+
+
+class FakeRegistry:
+    """Repository tags and their current digests, changed by bumping the tag"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.versions = Counter()
+        self.requests = Counter()
+
+    def digest(self, repository: str, tag: str) -> str:
+        with self.lock:
+            version = self.versions[(repository, tag)]
+        return "sha256:" + hashlib.sha256(f"{repository}:{tag}:{version}".encode()).hexdigest()
+
+    def bump(self, repository: str, tag: str) -> str:
+        with self.lock:
+            self.versions[(repository, tag)] += 1
+        return self.digest(repository, tag)
+
+
+def make_handler(registry: FakeRegistry, port: int):
+    class RegistryHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def reply(self, status: int, headers: dict = None, body: bytes = b""):
+            self.send_response(status)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+
+        def do_HEAD(self):
+            path = self.path.split("?", 1)[0]
+            if not path.startswith("/v2/") or "/manifests/" not in path:
+                return self.reply(404)
+            repository, _, tag = path[4:].rpartition("/manifests/")
+            if self.headers.get("Authorization") != f"Bearer {TOKEN}":
+                registry.requests["unauthorized"] += 1
+                return self.reply(401, {"WWW-Authenticate": f'Bearer realm="http://127.0.0.1:{port}/token",service="fake-registry",scope="repository:{repository}:pull"'})
+            digest = registry.digest(repository, tag)
+            if self.headers.get("If-None-Match") == f'"{digest}"':
+                registry.requests["not_modified"] += 1
+                return self.reply(304, {"ETag": f'"{digest}"'})
+            registry.requests["manifest"] += 1
+            self.reply(200, {"Docker-Content-Digest": digest, "ETag": f'"{digest}"', "Content-Type": "application/vnd.oci.image.index.v1+json"})
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path == "/token":
+                registry.requests["token"] += 1
+                return self.reply(200, {"Content-Type": "application/json"}, json.dumps({"token": TOKEN, "expires_in": 300}).encode())
+            if path == "/_registry/stats":
+                return self.reply(200, {"Content-Type": "application/json"}, json.dumps(dict(registry.requests)).encode())
+            if path.startswith("/v2/"):
+                return self.do_HEAD()
+            self.reply(404)
+
+        def do_POST(self):
+            if not self.path.startswith("/_registry/bump/"):
+                return self.reply(404)
+            repository, _, tag = self.path[len("/_registry/bump/"):].rpartition("/")
+            self.reply(200, {"Content-Type": "application/json"}, json.dumps({"digest": registry.bump(repository, tag)}).encode())
+
+        def log_message(self, format, *args):
+            pass
+
+    return RegistryHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in container registry for the dockcheck image update check")
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer((args.address, args.port), make_handler(FakeRegistry(), args.port))
+    print(f"Fake registry listening on http://{args.address}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#Copyright (c) 2024-25 2boom.
+
+"""Query the dockcheck event history (HISTORY_FILE) from the command line, newest events first. Example:
+
+    python tools/history.py --node nas --type containers --name 'web*' --since 7d
+"""
+
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import dockcheck
+
+
+def get_history_file() -> str:
+    """HISTORY_FILE of config.json, or the usual data/history.db"""
+    try:
+        with open(dockcheck.CONFIG_FILE, "r") as file:
+            history_file = json.load(file).get("HISTORY_FILE") or "data/history.db"
+    except (OSError, ValueError, AttributeError):
+        history_file = "data/history.db"
+    return os.path.join(os.path.dirname(dockcheck.CONFIG_FILE), history_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the dockcheck event history")
+    parser.add_argument("--file", default=get_history_file(), help="event history database, HISTORY_FILE of config.json by default")
+    parser.add_argument("--node", default="", help="node name")
+    parser.add_argument("--type", default="", choices=("", *dockcheck.CHECK_TYPES, "stats"), help="resource type")
+    parser.add_argument("--name", default="", help="resource name, globs such as 'web*' are accepted")
+    parser.add_argument("--since", default="", help="unix time, ISO date or age such as 30m, 12h, 7d")
+    parser.add_argument("--until", default="", help="unix time, ISO date or age such as 30m, 12h, 7d")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--json", action="store_true", help="print the events as JSON")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        parser.error(f"{args.file} not found, set HISTORY_FILE in config.json")
+    connection = dockcheck.open_history(args.file, read_only=True)
+    try:
+        events = dockcheck.query_history(
+            connection, args.node, args.type, args.name,
+            dockcheck.parse_history_time(args.since) if args.since else None,
+            dockcheck.parse_history_time(args.until) if args.until else None,
+            args.limit
+        )
+    finally:
+        connection.close()
+
+    if args.json:
+        print(json.dumps(events, indent=2))
+        return
+    for event in events:
+        short_id = f" ({event['short_id']})" if event["short_id"] else ""
+        print(f"{datetime.fromtimestamp(event['time']):%Y-%m-%d %H:%M:%S}  {event['node']}  .{event['type']}  {event['name']}{short_id}: {event['event']}")
+
+
+if __name__ == "__main__":
+    main()